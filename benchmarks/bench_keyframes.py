@@ -0,0 +1,205 @@
+"""
+Reproducible throughput benchmark for extract_keyframes and merge_keyframes_streaming.
+
+Usage:
+    python benchmarks/bench_keyframes.py --output results.json
+    python benchmarks/bench_keyframes.py --full --compare baseline.json --threshold 0.25
+
+Synthetic "slide deck" videos are generated locally with cv2.VideoWriter: slides held
+still for a known time, separated by scrolling transitions. The start of every still
+segment is the ground truth. Each configuration runs in a fresh process so its peak RSS
+is its own. With --compare the run fails (exit status 1) when frames/s, merge time,
+peak memory or keyframe recall regress by more than --threshold against the baseline.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extract_keyframes import extract_keyframes, merge_keyframes_streaming  # noqa: E402
+from extraction_stats import peak_rss_bytes  # noqa: E402
+
+VIDEO_DIR = os.path.join(tempfile.gettempdir(), "keysnap_bench_videos")
+# name: (width, height, fps, seconds, slide_seconds, transition_seconds)
+CONFIGS = {
+    "720p30_sparse": (1280, 720, 30, 20, 4.0, 1.0),
+    "720p30_dense": (1280, 720, 30, 20, 1.5, 0.5),
+    "1080p30_sparse": (1920, 1080, 30, 20, 4.0, 1.0),
+    "1080p60_dense": (1920, 1080, 60, 20, 1.5, 0.5),
+}
+FULL_CONFIGS = {
+    "2160p30_sparse": (3840, 2160, 30, 12, 4.0, 1.0),
+    "2160p60_dense": (3840, 2160, 60, 12, 1.5, 0.5),
+}
+EXTRACT_PARAMS = dict(sample_rate=30, min_interval=0.5, stillness_threshold=3, stillness_frames=5)
+
+
+def make_slide(rng, width, height):
+    """A screen-like frame: light background, a title bar, lines of "text" and colored blocks."""
+    slide = np.full((height, width, 3), 235, dtype=np.uint8)
+    slide[: height // 8] = rng.integers(40, 200, 3)
+    line_height = max(4, height // 40)
+    for y in range(height // 6, height - line_height, line_height * 2):
+        x = width // 20
+        while x < width * 19 // 20:
+            word = int(rng.integers(width // 60, width // 15))
+            slide[y:y + line_height, x:x + word] = 40
+            x += word + width // 80
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width * 3 // 4), rng.integers(height // 6, height * 3 // 4)
+        x1, y1 = x0 + rng.integers(width // 10, width // 4), y0 + rng.integers(height // 20, height // 5)
+        slide[y0:y1, x0:x1] = rng.integers(0, 255, 3)
+    return slide
+
+
+def generate_video(path, width, height, fps, seconds, slide_seconds, transition_seconds, seed=0):
+    """Write the synthetic video, return the start times of its still segments."""
+    rng = np.random.default_rng(seed)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    still_starts = []
+    slide = make_slide(rng, width, height)
+    frame_idx = 0
+    total = int(seconds * fps)
+    while frame_idx < total:
+        still_starts.append(frame_idx / fps)
+        for _ in range(int(slide_seconds * fps)):
+            if frame_idx >= total:
+                break
+            writer.write(slide)
+            frame_idx += 1
+        next_slide = make_slide(rng, width, height)
+        steps = int(transition_seconds * fps)
+        for step in range(steps):
+            if frame_idx >= total:
+                break
+            # Scroll the next slide in from the right
+            offset = width * (step + 1) // (steps + 1)
+            writer.write(np.concatenate([slide[:, offset:], next_slide[:, :offset]], axis=1))
+            frame_idx += 1
+        slide = next_slide
+    writer.release()
+    return still_starts
+
+
+def ensure_video(name, spec):
+    os.makedirs(VIDEO_DIR, exist_ok=True)
+    path = os.path.join(VIDEO_DIR, f"{name}.mp4")
+    truth_path = path + ".json"
+    if os.path.isfile(path) and os.path.isfile(truth_path):
+        with open(truth_path, "r") as f:
+            return path, json.load(f)
+    still_starts = generate_video(path, *spec)
+    with open(truth_path, "w") as f:
+        json.dump(still_starts, f)
+    return path, still_starts
+
+
+def keyframe_recall(still_starts, timestamps, tolerance):
+    """Fraction of still segments that got a keyframe within tolerance seconds after their start."""
+    hits = sum(any(0 <= ts - start <= tolerance for ts in timestamps) for start in still_starts)
+    return hits / len(still_starts) if still_starts else 1.0
+
+
+def run_config(video_path, still_starts, fps, extract_params):
+    """Runs in a fresh worker process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        keyframes = extract_keyframes(video_path, os.path.join(tmp, "keyframes"), **extract_params)
+        extract_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        merge_keyframes_streaming(keyframes, os.path.join(tmp, "merged.png"), max_per_row=5)
+        merge_seconds = time.perf_counter() - start
+    cap = cv2.VideoCapture(video_path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    timestamps = [ts for _, ts in keyframes]
+    # A keyframe is due once stillness_frames sampled frames have been still
+    sample_fps = fps / max(1, int(fps // extract_params["sample_rate"]))
+    tolerance = (extract_params["stillness_frames"] + 1) / sample_fps + 0.1
+    return {
+        "frames": frames,
+        "extract_seconds": extract_seconds,
+        "frames_per_second": frames / extract_seconds if extract_seconds > 0 else 0,
+        "keyframes": len(timestamps),
+        "still_segments": len(still_starts),
+        "recall": keyframe_recall(still_starts, timestamps, tolerance),
+        "precision": min(1.0, len(still_starts) / len(timestamps)) if timestamps else 0.0,
+        "merge_seconds": merge_seconds,
+        "peak_rss": peak_rss_bytes(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Return human readable regressions of results against baseline."""
+    regressions = []
+    for name, current in results["configs"].items():
+        base = baseline.get("configs", {}).get(name)
+        if not base:
+            continue
+        if current["frames_per_second"] < base["frames_per_second"] * (1 - threshold):
+            regressions.append(f"{name}: frames/s {base['frames_per_second']:.0f} -> {current['frames_per_second']:.0f}")
+        if current["merge_seconds"] > base["merge_seconds"] * (1 + threshold) + 0.05:
+            regressions.append(f"{name}: merge {base['merge_seconds']:.2f}s -> {current['merge_seconds']:.2f}s")
+        if base["peak_rss"] and current["peak_rss"] and current["peak_rss"] > base["peak_rss"] * (1 + threshold):
+            regressions.append(f"{name}: peak RSS {base['peak_rss'] / 1e6:.0f} MB -> {current['peak_rss'] / 1e6:.0f} MB")
+        if current["recall"] < base["recall"] - 1e-9:
+            regressions.append(f"{name}: recall {base['recall']:.2f} -> {current['recall']:.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--full", action="store_true", help="Include the 4K configurations")
+    parser.add_argument("--only", nargs="+", help="Run only these configurations")
+    parser.add_argument("--analysis-size", type=int, default=None)
+    parser.add_argument("--output", help="Write the results to this JSON file (e.g. a new baseline)")
+    parser.add_argument("--compare", help="Baseline JSON file to check the results against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args()
+
+    configs = dict(CONFIGS, **FULL_CONFIGS) if args.full else dict(CONFIGS)
+    if args.only:
+        configs = {name: configs[name] for name in args.only}
+    extract_params = dict(EXTRACT_PARAMS, analysis_size=args.analysis_size)
+
+    results = {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "opencv": cv2.__version__, "cpus": os.cpu_count()},
+        "params": extract_params,
+        "configs": {},
+    }
+    print(f"{'config':<16} {'frames/s':>9} {'recall':>6} {'keyframes':>9} {'merge':>7} {'peak RSS':>9}")
+    spawn = multiprocessing.get_context("spawn")
+    for name, spec in configs.items():
+        video_path, still_starts = ensure_video(name, spec)
+        with ProcessPoolExecutor(1, mp_context=spawn) as executor:
+            result = executor.submit(run_config, video_path, still_starts, spec[2], extract_params).result()
+        results["configs"][name] = result
+        rss = f"{result['peak_rss'] / 1e6:.0f} MB" if result["peak_rss"] else "n/a"
+        print(f"{name:<16} {result['frames_per_second']:>9.0f} {result['recall']:>6.2f} "
+              f"{result['keyframes']:>4}/{result['still_segments']:<4} {result['merge_seconds']:>6.2f}s {rss:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Compare keyframe extraction on downscaled analysis proxies against full-resolution analysis.
+
+Usage:
+    python benchmarks/compare_analysis_size.py input.mp4 --sizes 640 320 160
+
+For every analysis size it reports the keyframes that moved by more than --tolerance
+seconds (or disappeared/appeared) compared to full-res analysis, plus the analysis
+throughput (grayscale conversion + frame diff) measured on the same decoded frames.
+Exits with status 1 when any size falls outside the tolerance.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extract_keyframes import extract_keyframes, get_frame_diff, to_analysis_gray  # noqa: E402
+
+
+def match_timestamps(reference, candidate, tolerance):
+    """Return (max_shift, missing, extra) of candidate keyframe timestamps against reference."""
+    unmatched = list(candidate)
+    max_shift = 0.0
+    missing = []
+    for ts in reference:
+        nearest = min(unmatched, key=lambda c: abs(c - ts), default=None)
+        if nearest is None or abs(nearest - ts) > tolerance:
+            missing.append(ts)
+            continue
+        max_shift = max(max_shift, abs(nearest - ts))
+        unmatched.remove(nearest)
+    return max_shift, missing, unmatched
+
+
+def load_sampled_frames(video_path, sample_rate, limit):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_interval = max(1, int(fps // sample_rate))
+    frames = []
+    frame_idx = 0
+    while len(frames) < limit:
+        if frame_idx % frame_interval == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        elif not cap.grab():
+            break
+        frame_idx += 1
+    cap.release()
+    return frames
+
+
+def analysis_throughput(frames, analysis_size):
+    """Frames per second of the analysis stage alone (cvtColor/resize + diff)."""
+    start = time.perf_counter()
+    prev_gray = None
+    for frame in frames:
+        gray = to_analysis_gray(frame, analysis_size)
+        if prev_gray is not None:
+            get_frame_diff(prev_gray, gray)
+        prev_gray = gray
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed if elapsed > 0 else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[640, 320, 160])
+    parser.add_argument("--sample-rate", type=int, default=24)
+    parser.add_argument("--min-interval", type=float, default=0.5)
+    parser.add_argument("--stillness-threshold", type=float, default=3)
+    parser.add_argument("--stillness-frames", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed timestamp shift in seconds")
+    parser.add_argument("--frames", type=int, default=300, help="Frames used for the throughput measurement")
+    args = parser.parse_args()
+
+    params = dict(
+        sample_rate=args.sample_rate,
+        min_interval=args.min_interval,
+        stillness_threshold=args.stillness_threshold,
+        stillness_frames=args.stillness_frames,
+    )
+    frames = load_sampled_frames(args.video, args.sample_rate, args.frames)
+    if not frames:
+        sys.exit(f"Could not read any frame of {args.video}")
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for size in [None] + args.sizes:
+            start = time.perf_counter()
+            keyframes = extract_keyframes(
+                args.video, os.path.join(tmp, str(size)), analysis_size=size, **params
+            )
+            results[size] = ([ts for _, ts in keyframes], time.perf_counter() - start)
+
+    reference, ref_time = results[None]
+    ref_fps = analysis_throughput(frames, None)
+    print(f"{'size':>6} {'keyframes':>9} {'max shift':>9} {'missing':>7} {'extra':>5} "
+          f"{'analysis fps':>12} {'speedup':>7} {'wall':>7}")
+    print(f"{'full':>6} {len(reference):>9} {0.0:>9.2f} {0:>7} {0:>5} {ref_fps:>12.1f} {1.0:>6.1f}x {ref_time:>6.2f}s")
+    for size in args.sizes:
+        timestamps, wall = results[size]
+        max_shift, missing, extra = match_timestamps(reference, timestamps, args.tolerance)
+        size_fps = analysis_throughput(frames, size)
+        print(f"{size:>6} {len(timestamps):>9} {max_shift:>9.2f} {len(missing):>7} {len(extra):>5} "
+              f"{size_fps:>12.1f} {size_fps / ref_fps:>6.1f}x {wall:>6.2f}s")
+        if missing or extra:
+            ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare the frame change metrics of frame_metrics on a video: per-frame cost and keyframes.
+
+Usage:
+    python benchmarks/compare_metrics.py input.mp4 --analysis-size 320
+    python benchmarks/compare_metrics.py input.mp4 --threshold phash=4 --threshold block=6
+
+Each metric runs with its default_threshold unless --threshold overrides it. Keyframes are
+matched against the "mean" metric (the original one) within --tolerance seconds, the cost
+is measured on the same decoded analysis frames for every metric.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compare_analysis_size import load_sampled_frames, match_timestamps  # noqa: E402
+from extract_keyframes import extract_keyframes, to_analysis_gray  # noqa: E402
+from frame_metrics import METRICS, profile_metric  # noqa: E402
+
+
+def parse_thresholds(values):
+    thresholds = {name: metric.default_threshold for name, metric in METRICS.items()}
+    for value in values:
+        name, _, threshold = value.partition("=")
+        if name not in METRICS:
+            raise SystemExit(f"Unknown metric: {name}")
+        thresholds[name] = float(threshold)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("video")
+    parser.add_argument("--metrics", nargs="+", choices=sorted(METRICS), default=list(METRICS))
+    parser.add_argument("--threshold", action="append", default=[], metavar="METRIC=VALUE",
+                        help="Stillness threshold of a metric, repeatable")
+    parser.add_argument("--analysis-size", type=int, default=None)
+    parser.add_argument("--sample-rate", type=int, default=24)
+    parser.add_argument("--min-interval", type=float, default=0.5)
+    parser.add_argument("--stillness-frames", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed timestamp shift in seconds")
+    parser.add_argument("--frames", type=int, default=300, help="Frames used for the cost measurement")
+    args = parser.parse_args()
+
+    thresholds = parse_thresholds(args.threshold)
+    grays = [
+        to_analysis_gray(frame, args.analysis_size)
+        for frame in load_sampled_frames(args.video, args.sample_rate, args.frames)
+    ]
+    metrics = ["mean"] + [name for name in args.metrics if name != "mean"]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in metrics:
+            start = time.perf_counter()
+            keyframes = extract_keyframes(
+                args.video, os.path.join(tmp, name), sample_rate=args.sample_rate,
+                min_interval=args.min_interval, stillness_threshold=thresholds[name],
+                stillness_frames=args.stillness_frames, analysis_size=args.analysis_size, metric=name
+            )
+            results[name] = ([ts for _, ts in keyframes], time.perf_counter() - start)
+
+    reference = results["mean"][0]
+    print(f"{'metric':<10} {'threshold':>9} {'sig us':>8} {'dist us':>8} {'sig bytes':>9} "
+          f"{'keyframes':>9} {'missing':>7} {'extra':>5} {'wall':>7}")
+    for name in metrics:
+        cost = profile_metric(name, grays)
+        timestamps, wall = results[name]
+        _, missing, extra = match_timestamps(reference, timestamps, args.tolerance)
+        print(f"{name:<10} {thresholds[name]:>9g} {cost['signature_us']:>8.1f} {cost['distance_us']:>8.1f} "
+              f"{cost['signature_bytes']:>9} {len(timestamps):>9} {len(missing):>7} {len(extra):>5} {wall:>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
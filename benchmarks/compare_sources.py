@@ -0,0 +1,97 @@
+"""
+Compare the frame sources of frame_sources on videos: decode throughput and keyframes.
+
+Usage:
+    python benchmarks/compare_sources.py recording.mp4 screencast.mkv --analysis-size 320
+    python benchmarks/compare_sources.py input.mp4 --threads 4 --repeat 3
+
+Every video is scanned (scan_frame_diffs) with OpenCV's VideoCapture as is, with
+--threads decoder threads and with hardware decoding, then with an ffmpeg subprocess
+with and without --threads when ffmpeg is on PATH. The fastest configuration of each
+video is marked; which one wins depends on the codec, the container and the machine.
+Keyframes are matched against the default VideoCapture within --tolerance seconds.
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compare_analysis_size import match_timestamps  # noqa: E402
+from extract_keyframes import scan_frame_diffs, select_keyframes  # noqa: E402
+from frame_sources import FFmpegPipeSource, VideoCaptureSource  # noqa: E402
+
+
+def source_configs(threads, ffmpeg):
+    configs = [
+        ("opencv", VideoCaptureSource()),
+        (f"opencv threads={threads}", VideoCaptureSource(threads=threads)),
+        ("opencv hwaccel", VideoCaptureSource(hw_acceleration=True)),
+    ]
+    if FFmpegPipeSource(ffmpeg).available():
+        configs += [
+            ("ffmpeg", FFmpegPipeSource(ffmpeg)),
+            (f"ffmpeg threads={threads}", FFmpegPipeSource(ffmpeg, threads=threads)),
+        ]
+    else:
+        print(f"{ffmpeg} not found, skipping the ffmpeg source")
+    return configs
+
+
+def video_codec(video_path):
+    cap = cv2.VideoCapture(video_path)
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    cap.release()
+    codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\0 ")
+    return codec or "?", os.path.splitext(video_path)[1].lstrip(".") or "?"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("videos", nargs="+")
+    parser.add_argument("--threads", type=int, default=os.cpu_count(), help="Decoder threads to try")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable")
+    parser.add_argument("--analysis-size", type=int, default=None)
+    parser.add_argument("--sample-rate", type=int, default=24)
+    parser.add_argument("--stillness-threshold", type=float, default=3)
+    parser.add_argument("--stillness-frames", type=int, default=5)
+    parser.add_argument("--min-interval", type=float, default=0.5)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed timestamp shift in seconds")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration, the best one counts")
+    args = parser.parse_args()
+
+    configs = source_configs(args.threads, args.ffmpeg)
+    for video in args.videos:
+        codec, container = video_codec(video)
+        fps, total_frames, width, height = VideoCaptureSource().probe(video)
+        print(f"\n{video}: {codec} in {container}, {width}x{height}, {total_frames} frames at {fps:.2f} fps")
+        results = []
+        for name, source in configs:
+            best = None
+            try:
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    series = scan_frame_diffs(video, args.sample_rate, args.analysis_size, source=source)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+            except (RuntimeError, cv2.error) as e:
+                print(f"{name:<20} failed: {e}")
+                continue
+            selected = select_keyframes(series, args.stillness_threshold, args.stillness_frames, args.min_interval)
+            results.append((name, best, series["timestamp"][selected].tolist()))
+        if not results:
+            continue
+        reference = results[0][2]
+        fastest = min(seconds for _, seconds, _ in results)
+        print(f"{'source':<20} {'seconds':>8} {'frames/s':>9} {'keyframes':>9} {'missing':>7} {'extra':>5}")
+        for name, seconds, timestamps in results:
+            _, missing, extra = match_timestamps(reference, timestamps, args.tolerance)
+            marker = "  <- fastest" if seconds == fastest else ""
+            print(f"{name:<20} {seconds:>8.2f} {total_frames / seconds:>9.0f} {len(timestamps):>9} "
+                  f"{len(missing):>7} {len(extra):>5}{marker}")
+
+
+if __name__ == "__main__":
+    main()
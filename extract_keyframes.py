@@ -1,7 +1,23 @@
 import cv2
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
+import io
 import os
+import queue
+import struct
+import zlib
+import threading
+import time
+import multiprocessing
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from extraction_progress import throttled
+from extraction_stats import NO_STATS
+from frame_metrics import HashIndex, get_metric, mean_abs_diff, perceptual_hash
+from frame_sources import (  # noqa: F401 (the sampling helpers and constants are re-exported)
+    SAMPLING_MODES, SEEK_MIN_INTERVAL, VideoCaptureSource, iter_sampled_frames, sample_interval
+)
 
 VIDEO_PATH = "input.mp4"
 OUTPUT_DIR = "keyframes"
@@ -9,86 +25,960 @@ MERGED_IMAGE_PATH = "keyframes_merged.png"
 FRAME_DIFF_THRESHOLD = 25  # Lower = more sensitive
 FRAME_SAMPLE_RATE = 24     # Frames per second to sample, 24=all, 1=one per second
 MIN_KEYFRAME_INTERVAL = 0.5  # Minimum seconds between two keyframes
+DECODE_QUEUE_SIZE = 8      # Decoded frames buffered ahead of the analyzer, 0 = decode inline
+WRITER_THREADS = 2         # Threads encoding keyframe images, 0 = write inline
+SEGMENT_PROGRESS_STEP = 100  # Frames between progress reports of a segment worker
+ADAPTIVE_COARSE_RATE = 2   # Frames per second decoded where adaptive sampling skips still parts
+ADAPTIVE_CROSSING_TRIALS = 4  # Skipped intervals crossed by seeking and by grabbing to time both
+DEDUPE_MODES = ("skip", "repeat")
+IMAGE_FORMATS = ("png", "jpg", "webp")
+IN_MEMORY_MODES = ("bytes", "arrays")  # What KeyframeWriter keeps instead of writing files
+# One record per sampled frame; diff is the frame difference to the previous sampled frame
+DIFF_SERIES_DTYPE = np.dtype([("frame_idx", "<i4"), ("timestamp", "<f8"), ("diff", "<f8")])
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
+def to_analysis_gray(frame, analysis_size=None):
+    """
+    Convert a BGR frame to the grayscale image used for stillness detection.
+    analysis_size: maximum width in pixels of the analysis proxy; larger frames are
+    downscaled before the gray conversion. None analyzes at full resolution.
+    """
+    h, w = frame.shape[:2]
+    if analysis_size and w > analysis_size:
+        # Resize the BGR frame first so cvtColor only sees the proxy. INTER_LINEAR averages
+        # the 2x2 source pixels around each proxy pixel (the same as INTER_AREA for an exact
+        # halving) and skips the rest, whereas INTER_AREA would read the whole frame
+        size = (analysis_size, max(1, round(h * analysis_size / w)))
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
 def get_frame_diff(img1, img2):
     # Calculate mean pixel difference between two grayscale images
-    diff = cv2.absdiff(img1, img2)
-    return np.mean(diff)
+    return mean_abs_diff(img1, img2)
+
+def keyframe_filename(index, timestamp, extension=".png"):
+    return f"keyframe_{index:03d}_{timestamp:.2f}{extension}"
+
+class StillnessDetector:
+    """
+    The stillness state machine: a frame is still when the last stillness_frames frame
+    diffs are all below stillness_threshold (the first frame counts as a zero diff).
+    update() returns True when the frame enters the still state from the moving state.
+    metric: frame change metric name or object, see frame_metrics
+    """
+    def __init__(self, stillness_threshold=3, stillness_frames=5, metric="mean"):
+        self.stillness_threshold = stillness_threshold
+        self.stillness_frames = stillness_frames
+        self.metric = get_metric(metric)
+        self.prev_signature = None
+        self.stillness_queue = []
+        self.prev_state_still = False  # Is currently in still state
+
+    def update(self, gray):
+        signature = self.metric.signature(gray)
+        diff = self.metric.distance(self.prev_signature, signature) if self.prev_signature is not None else 0
+        self.prev_signature = signature
+        return self.push(diff)
+
+    def push(self, diff):
+        """Feed the diff of the next frame directly, e.g. when replaying a diff series."""
+        self.stillness_queue.append(diff)
+        if len(self.stillness_queue) > self.stillness_frames:
+            self.stillness_queue.pop(0)
+
+        # Check if current state is still
+        is_still = (
+            len(self.stillness_queue) == self.stillness_frames
+            and all(d < self.stillness_threshold for d in self.stillness_queue)
+        )
+        entering = is_still and not self.prev_state_still
+        self.prev_state_still = is_still
+        return entering
+
+def iter_in_background(iterable, queue_size=DECODE_QUEUE_SIZE):
+    """
+    Consume iterable on a background thread and yield its items through a bounded queue.
+    The producer blocks while queue_size items are waiting (backpressure), exceptions it
+    raises are re-raised here. Closing the generator stops and joins the producer.
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            # Release the decoder (capture, ffmpeg process) right away, not when collected
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def held_frames(decode_queue_size):
+    """
+    Frames an analysis loop may still reference when it takes the next one from a source:
+    the current and the previous frame (a metric signature can be the frame itself), the
+    frames in the decode queue and the one the decode thread waits to queue.
+    """
+    return 2 + (decode_queue_size + 1 if decode_queue_size > 0 else 0)
+
+class ImageFormat:
+    """
+    Encoding of saved keyframes and merged images.
+    kind: "png", "jpg" or "webp"
+    quality: 0-100 for jpg and webp, None uses the encoder's default
+    png_compression: zlib level 0-9 for png, lower is faster and bigger, None uses the default
+    """
+    def __init__(self, kind="png", quality=None, png_compression=None):
+        if kind not in IMAGE_FORMATS:
+            raise ValueError(f"Unknown image format: {kind}")
+        self.kind = kind
+        self.quality = quality
+        self.png_compression = png_compression
+
+    @property
+    def extension(self):
+        return "." + self.kind
+
+    def to_dict(self):
+        return {"kind": self.kind, "quality": self.quality, "png_compression": self.png_compression}
+
+    def cv2_params(self):
+        if self.kind == "png" and self.png_compression is not None:
+            return [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression]
+        if self.kind == "jpg" and self.quality is not None:
+            return [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        if self.kind == "webp" and self.quality is not None:
+            return [cv2.IMWRITE_WEBP_QUALITY, self.quality]
+        return []
+
+    def pil_params(self):
+        if self.kind == "png":
+            params = {"format": "PNG"}
+            if self.png_compression is not None:
+                params["compress_level"] = self.png_compression
+            return params
+        params = {"format": "JPEG" if self.kind == "jpg" else "WEBP"}
+        if self.quality is not None:
+            params["quality"] = self.quality
+        return params
+
+    def encode(self, frame):
+        """Encode a BGR array, return the bytes."""
+        ok, data = cv2.imencode(self.extension, frame, self.cv2_params())
+        if not ok:
+            raise RuntimeError(f"Cannot encode a keyframe as {self.kind}")
+        return data.tobytes()
+
+DEFAULT_IMAGE_FORMAT = ImageFormat()
+
+class KeyframeDeduplicator:
+    """
+    Perceptual hashes of the keyframes written so far. A keyframe within max_distance bits
+    (0-64) of an earlier one is a near-duplicate and gets no image of its own:
+    mode "skip" drops it, "repeat" records it with the earlier keyframe's image.
+    entries: (hash, position in the keyframes list) pairs of earlier keyframes, e.g. from
+    a checkpoint
+    """
+    def __init__(self, max_distance, mode="skip", entries=()):
+        if mode not in DEDUPE_MODES:
+            raise ValueError(f"Unknown dedupe mode: {mode}")
+        self.max_distance = max_distance
+        self.mode = mode
+        self.index = HashIndex([frame_hash for frame_hash, _ in entries])
+        self.positions = [position for _, position in entries]
+
+    @staticmethod
+    def frame_hash(frame):
+        # Hash the full-res frame so every extraction path agrees on duplicates
+        return perceptual_hash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+
+    def find(self, frame_hash):
+        """Keyframes list position of an earlier keyframe close enough to frame_hash, or None."""
+        nearest, distance = self.index.nearest(frame_hash)
+        if nearest is not None and distance <= self.max_distance:
+            return self.positions[nearest]
+        return None
+
+    def add(self, frame_hash, position):
+        self.index.add(frame_hash)
+        self.positions.append(position)
+
+    @property
+    def entries(self):
+        return [[int(frame_hash), position] for frame_hash, position in zip(self.index.hashes, self.positions)]
+
+class KeyframeWriter:
+    """
+    Names, records and saves keyframes in the order they are added.
+    With threads > 0 the image encoding runs on a thread pool (OpenCV releases the GIL
+    while encoding); at most max_pending writes are in flight, add() waits for the
+    oldest one beyond that. Use as a context manager, or call close() to wait for all writes.
+    stats: ExtractionStats recording the "encode" stage and the bytes written
+    keyframes: (path, timestamp) pairs already written, numbering continues after them
+    duplicates: KeyframeDeduplicator applied to every added keyframe, None keeps them all
+    image_format: ImageFormat of the saved keyframes, PNG by default
+    in_memory: "bytes" keeps the encoded images and "arrays" the BGR frames in the
+    keyframes list instead of paths, nothing is written to output_dir. The entries are
+    complete once flush() or close() returned.
+    """
+    def __init__(
+        self, output_dir, threads=WRITER_THREADS, max_pending=None, stats=None, keyframes=None,
+        duplicates=None, image_format=None, in_memory=None
+    ):
+        if in_memory not in (None,) + IN_MEMORY_MODES:
+            raise ValueError(f"Unknown in-memory mode: {in_memory}")
+        self.output_dir = output_dir
+        self.stats = stats or NO_STATS
+        self.keyframes = list(keyframes or [])
+        self.duplicates = duplicates
+        self.image_format = image_format or DEFAULT_IMAGE_FORMAT
+        self.in_memory = in_memory
+        self.max_pending = max_pending or max(1, threads) * 2
+        self._pending = deque()
+        self._repeats = []
+        self._executor = ThreadPoolExecutor(threads) if threads > 0 and in_memory != "arrays" else None
+
+    def add(self, frame, timestamp):
+        """
+        Save a keyframe, return its keyframes list entry: the path (or bytes or array), the
+        earlier keyframe's one for a repeat, None when skipped as a near-duplicate.
+        """
+        position = len(self.keyframes)
+        if self.duplicates:
+            with self.stats.stage("dedupe"):
+                frame_hash = self.duplicates.frame_hash(frame)
+                earlier = self.duplicates.find(frame_hash)
+            if earlier is not None:
+                self.stats.count("keyframes_deduplicated")
+                if self.duplicates.mode == "skip":
+                    return None
+                self.keyframes.append((self.keyframes[earlier][0], timestamp))
+                if self.keyframes[earlier][0] is None:
+                    # Still being encoded, filled in by flush()
+                    self._repeats.append((position, earlier))
+                return self.keyframes[earlier][0]
+        if self.in_memory == "arrays":
+            self.keyframes.append((frame, timestamp))
+        else:
+            out_path = None
+            if not self.in_memory:
+                filename = keyframe_filename(position, timestamp, self.image_format.extension)
+                out_path = os.path.join(self.output_dir, filename)
+            self.keyframes.append((out_path, timestamp))
+            if self._executor:
+                while len(self._pending) >= self.max_pending:
+                    self._pending.popleft().result()
+                self._pending.append(self._executor.submit(self._write, position, out_path, frame))
+            else:
+                self._write(position, out_path, frame)
+        if self.duplicates:
+            self.duplicates.add(frame_hash, position)
+        return self.keyframes[position][0]
+
+    def _write(self, position, out_path, frame):
+        with self.stats.stage("encode"):
+            if out_path is None:
+                data = self.image_format.encode(frame)
+                self.keyframes[position] = (data, self.keyframes[position][1])
+                size = len(data)
+            else:
+                cv2.imwrite(out_path, frame, self.image_format.cv2_params())
+        if self.stats is not NO_STATS and (out_path is None or os.path.isfile(out_path)):
+            self.stats.count("keyframes_written")
+            self.stats.count("bytes_written", size if out_path is None else os.path.getsize(out_path))
+
+    def flush(self):
+        while self._pending:
+            self._pending.popleft().result()
+        for position, earlier in self._repeats:
+            self.keyframes[position] = (self.keyframes[earlier][0], self.keyframes[position][1])
+        self._repeats = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._executor:
+                self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
 def extract_keyframes(
     video_path, output_dir, diff_threshold=25, sample_rate=24, min_interval=0.5,
-    stillness_threshold=3, stillness_frames=5, progress_callback=None
+    stillness_threshold=3, stillness_frames=5, progress_callback=None, sampling="auto",
+    analysis_size=None, decode_queue_size=DECODE_QUEUE_SIZE, writer_threads=WRITER_THREADS,
+    stats=None, cancel_token=None, metric="mean", dedupe_distance=None, dedupe_mode="skip",
+    image_format=None, in_memory=None, source=None
 ):
     """
     Only extract keyframe when the image is stable for stillness_frames frames.
     stillness_threshold: pixel diff threshold to consider as 'still'
     stillness_frames: how many frames must be still to be considered stable
-    progress_callback: function(current_frame, total_frames)
+    progress_callback: function(current_frame, total_frames), calls are coalesced by a
+    ProgressReporter unless one is passed in
+    sampling: how non-sampled frames are skipped, see iter_sampled_frames
+    analysis_size: max width of the frame used for stillness detection (e.g. 320),
+    keyframes are still saved at full resolution. None analyzes full-res frames.
+    decode_queue_size: frames decoded ahead on a background thread, 0 decodes inline
+    writer_threads: threads saving keyframe images, 0 saves inline
+    stats: ExtractionStats to record per-stage timings and counters in, None to skip
+    cancel_token: cooperative pause/cancel flag, see iter_sampled_frames
+    metric: how the change between two sampled frames is measured, see frame_metrics;
+    stillness_threshold is in the metric's units
+    dedupe_distance: keyframes whose perceptual hash is within this many bits of an earlier
+    keyframe are near-duplicates and get no image, None keeps every keyframe
+    dedupe_mode: "skip" drops near-duplicates, "repeat" lists them again with the earlier
+    keyframe's path and their own timestamp
+    image_format: ImageFormat of the keyframe images, PNG by default
+    in_memory: "bytes" or "arrays" returns encoded images or BGR frames instead of paths
+    and writes nothing, output_dir may then be None (see KeyframeWriter)
+    source: frame source decoding the video, see frame_sources; None uses a default
+    VideoCaptureSource
+    """
+    stats = stats or NO_STATS
+    progress_callback = throttled(progress_callback)
+    if not in_memory:
+        ensure_dir(output_dir)
+    source = source or VideoCaptureSource()
+    fps, total_frames, _, _ = source.probe(video_path)
+    frame_interval = sample_interval(fps, sample_rate)
+    detector = StillnessDetector(stillness_threshold, stillness_frames, metric)
+    duplicates = KeyframeDeduplicator(dedupe_distance, dedupe_mode) if dedupe_distance is not None else None
+    last_keyframe_time = -min_interval
+    # Sources yielding analysis frames only: the keyframes are saved afterwards by seeking
+    selected = [] if source.analysis_frames else None
+
+    frames = source.sampled_frames(
+        video_path, frame_interval, sampling, progress_callback, total_frames,
+        analysis_size=analysis_size, stats=stats, cancel_token=cancel_token,
+        held_frames=held_frames(decode_queue_size)
+    )
+    if decode_queue_size > 0:
+        frames = iter_in_background(frames, decode_queue_size)
+    try:
+        with KeyframeWriter(
+            output_dir, writer_threads, stats=stats, duplicates=duplicates, image_format=image_format,
+            in_memory=in_memory
+        ) as writer:
+            for frame_idx, timestamp, frame in frames:
+                stats.count("frames_analyzed")
+                with stats.stage("convert"):
+                    gray = frame if selected is not None else to_analysis_gray(frame, analysis_size)
+                with stats.stage("diff"):
+                    entering = detector.update(gray)
+                # Only extract keyframe when entering still state from moving state
+                if entering and (timestamp - last_keyframe_time) >= min_interval:
+                    if selected is not None:
+                        selected.append((frame_idx, timestamp))
+                    else:
+                        writer.add(frame, timestamp)
+                    last_keyframe_time = timestamp
+    finally:
+        frames.close()
+    if progress_callback:
+        progress_callback.finish()
+    if selected is not None:
+        return save_keyframes_at(
+            video_path, output_dir, [idx for idx, _ in selected], [ts for _, ts in selected],
+            writer_threads, stats, cancel_token, dedupe_distance, dedupe_mode, image_format, in_memory
+        )
+    return writer.keyframes
+
+def scan_frame_diffs(
+    video_path, sample_rate=24, analysis_size=None, progress_callback=None, sampling="auto",
+    decode_queue_size=DECODE_QUEUE_SIZE, stats=None, cancel_token=None, metric="mean", source=None
+):
+    """
+    Decode the sampled frames of a video and return its diff series, a DIFF_SERIES_DTYPE
+    array. Replaying the series with select_keyframes gives the same keyframes as
+    extract_keyframes for any stillness parameters, without decoding the video again.
+    metric: frame change metric the diffs are measured with, see frame_metrics
+    source: frame source decoding the video, see extract_keyframes
+    """
+    metric = get_metric(metric)
+    stats = stats or NO_STATS
+    progress_callback = throttled(progress_callback)
+    source = source or VideoCaptureSource()
+    fps, total_frames, _, _ = source.probe(video_path)
+    frame_interval = sample_interval(fps, sample_rate)
+    records = []
+    prev_signature = None
+    frames = source.sampled_frames(
+        video_path, frame_interval, sampling, progress_callback, total_frames,
+        analysis_size=analysis_size, stats=stats, cancel_token=cancel_token,
+        held_frames=held_frames(decode_queue_size)
+    )
+    if decode_queue_size > 0:
+        frames = iter_in_background(frames, decode_queue_size)
+    try:
+        for frame_idx, timestamp, frame in frames:
+            stats.count("frames_analyzed")
+            with stats.stage("convert"):
+                gray = frame if source.analysis_frames else to_analysis_gray(frame, analysis_size)
+            with stats.stage("diff"):
+                signature = metric.signature(gray)
+                diff = metric.distance(prev_signature, signature) if prev_signature is not None else 0
+            records.append((frame_idx, timestamp, diff))
+            prev_signature = signature
+    finally:
+        frames.close()
+    if progress_callback:
+        progress_callback.finish()
+    return np.array(records, dtype=DIFF_SERIES_DTYPE)
+
+def adaptive_intervals(fps, sample_rate, coarse_rate=ADAPTIVE_COARSE_RATE):
+    """(frame_interval, coarse_interval) of adaptive sampling, equal when there is nothing to skip."""
+    frame_interval = sample_interval(fps, sample_rate)
+    # A multiple of frame_interval, so every coarse frame is also a sampled frame
+    return frame_interval, frame_interval * max(1, int(round(fps / coarse_rate / frame_interval)))
+
+class SkipPlanner:
+    """
+    Decides for scan_frame_diffs_adaptive whether to skip the next coarse interval and how
+    to cross it, from the times measured so far. Skipping costs the crossing and, when the
+    interval changed after all, analyzing it frame by frame from a seek back; not skipping
+    costs analyzing it frame by frame.
+    sampling: crossing mode, "auto" crosses ADAPTIVE_CROSSING_TRIALS intervals with each of
+    "seek" and "grab", then keeps the faster one and skips only while that pays off
+    """
+    def __init__(self, sampling="auto"):
+        self.sampling = sampling
+        # name: [seconds, count] for the crossing modes, "analyze" and "refine"
+        self.seconds = {name: [0.0, 0] for name in ("seek", "grab", "read", "analyze", "refine")}
+        self.outcomes = {True: 0, False: 0}  # Intervals after a still one, by whether they were still
+
+    def record(self, name, seconds):
+        self.seconds[name][0] += seconds
+        self.seconds[name][1] += 1
+
+    def record_outcome(self, still):
+        self.outcomes[still] += 1
+
+    def mean(self, name, default=None):
+        seconds, count = self.seconds[name]
+        return seconds / count if count else default
+
+    def crossing_mode(self):
+        if self.sampling != "auto":
+            return self.sampling
+        # Each mode gets ADAPTIVE_CROSSING_TRIALS crossings, or as much time as those of the other
+        untried = [
+            mode for mode, other in (("seek", "grab"), ("grab", "seek"))
+            if self.seconds[mode][1] < ADAPTIVE_CROSSING_TRIALS
+            and self.seconds[mode][0] < ADAPTIVE_CROSSING_TRIALS * self.mean(other, float("inf"))
+        ]
+        if untried:
+            return min(untried, key=lambda mode: self.seconds[mode][1])
+        return min(("seek", "grab"), key=self.mean)
+
+    def should_skip(self):
+        if self.sampling != "auto":
+            return True
+        crossing = self.mean(self.crossing_mode())
+        analyze = self.mean("analyze")
+        if crossing is None or analyze is None:
+            return True
+        changed = self.outcomes[False] / max(1, self.outcomes[True] + self.outcomes[False])
+        return crossing + changed * self.mean("refine", analyze) < analyze
+
+def scan_frame_diffs_adaptive(
+    video_path, sample_rate=24, analysis_size=None, progress_callback=None, sampling="auto",
+    decode_queue_size=DECODE_QUEUE_SIZE, stats=None, cancel_token=None, metric="mean",
+    coarse_rate=ADAPTIVE_COARSE_RATE, refine_threshold=None, source=None, frame_callback=None
+):
+    """
+    scan_frame_diffs for mostly static videos. The video is followed one coarse interval
+    (1 / coarse_rate seconds) at a time: while it changes, every sampled frame is analyzed
+    as by scan_frame_diffs. Once the two ends of an interval differ by less than
+    refine_threshold, the next intervals are skipped, only their last frame is decoded and
+    compared with the first one and the frames in between get a diff of 0. A skipped
+    interval whose ends differ is decoded again frame by frame, so select_keyframes finds
+    the exact frame where the video becomes still, unless something changes and changes
+    back within one skipped interval.
+    refine_threshold: ends difference from which an interval is analyzed frame by frame,
+    in the metric's units; None uses half the metric's default_threshold. Keep it below
+    stillness_threshold.
+    sampling: how skipped intervals are crossed, "seek", "grab" or "read". A seek decodes
+    from the previous keyframe, so which is faster depends on the video's keyframe spacing;
+    "auto" measures it and skips only while skipping is faster than analyzing, see SkipPlanner
+    source: VideoCaptureSource decoding the video
+    decode_queue_size: frames decoded ahead while an interval is analyzed frame by frame
+    frame_callback: function(frame_idx, timestamp, diff, frame) called for every record of
+    the series in order, frame is the BGR frame or None where it wasn't decoded
+    The other parameters are the ones of scan_frame_diffs.
+    """
+    metric = get_metric(metric)
+    stats = stats or NO_STATS
+    progress_callback = throttled(progress_callback)
+    if refine_threshold is None:
+        refine_threshold = metric.default_threshold / 2
+    source = source or VideoCaptureSource()
+    fps, total_frames, _, _ = source.probe(video_path)
+    frame_interval, coarse_interval = adaptive_intervals(fps, sample_rate, coarse_rate)
+    if coarse_interval == frame_interval:
+        series = scan_frame_diffs(
+            video_path, sample_rate, analysis_size, progress_callback, sampling, decode_queue_size,
+            stats, cancel_token, metric, source
+        )
+        if frame_callback:
+            for frame_idx, timestamp, diff in series.tolist():
+                frame_callback(frame_idx, timestamp, diff, None)
+        return series
+    if sampling != "auto" and sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    planner = SkipPlanner(sampling)
+
+    def sampled(start, end, interval=frame_interval, mode="grab"):
+        return iter_sampled_frames(
+            cap, interval, mode, progress_callback, total_frames, start_frame=start, end_frame=end,
+            stats=stats, cancel_token=cancel_token
+        )
+
+    def analyze(frame):
+        stats.count("frames_analyzed")
+        with stats.stage("convert"):
+            gray = to_analysis_gray(frame, analysis_size)
+        with stats.stage("diff"):
+            return metric.signature(gray)
+
+    def distance(signature1, signature2):
+        with stats.stage("diff"):
+            return metric.distance(signature1, signature2)
+
+    records = []
+
+    def record(frame_idx, timestamp, diff, frame=None):
+        records.append((frame_idx, timestamp, diff))
+        if frame_callback:
+            frame_callback(frame_idx, timestamp, diff, frame)
+
+    cap = source.open(video_path)
+    try:
+        first = next(sampled(0, 1), None)
+        if first is None:
+            return np.array([], dtype=DIFF_SERIES_DTYPE)
+        start, start_signature = 0, analyze(first[2])
+        record(0, first[1], 0, first[2])
+        # The first interval is analyzed frame by frame, the video may become still in it
+        changing = True
+        while True:
+            end = start + coarse_interval
+            after_still, skipped = not changing, False
+            if after_still and planner.should_skip():
+                # Skip the interval: decode only its last frame
+                mode = planner.crossing_mode()
+                began = time.perf_counter()
+                frames = sampled(start + 1, end + 1, coarse_interval, mode)
+                crossed = next(frames, None)
+                frames.close()
+                planner.record(mode, time.perf_counter() - began)
+                if crossed is None:
+                    # Less than an interval left, analyze all of it
+                    end = None
+                else:
+                    end_signature = analyze(crossed[2])
+                    changing = distance(start_signature, end_signature) >= refine_threshold
+                    planner.record_outcome(not changing)
+                    if not changing:
+                        for idx in range(start + frame_interval, end, frame_interval):
+                            record(idx, idx / fps, 0)
+                        record(end, crossed[1], 0, crossed[2])
+                        start, start_signature = end, end_signature
+                        continue
+                    skipped = True
+            # Analyze the interval frame by frame, decoding it again when it was skipped
+            began = time.perf_counter()
+            prev_signature, last = start_signature, None
+            frames = sampled(start + 1, end + 1 if end is not None else None)
+            if decode_queue_size > 0:
+                frames = iter_in_background(frames, decode_queue_size)
+            try:
+                for frame_idx, timestamp, frame in frames:
+                    signature = analyze(frame)
+                    record(frame_idx, timestamp, distance(prev_signature, signature), frame)
+                    prev_signature, last = signature, frame_idx
+            finally:
+                frames.close()
+            if end is None or last != end:
+                break
+            planner.record("refine" if skipped else "analyze", time.perf_counter() - began)
+            changing = distance(start_signature, prev_signature) >= refine_threshold
+            if after_still and not skipped:
+                planner.record_outcome(not changing)
+            start, start_signature = end, prev_signature
+    finally:
+        cap.release()
+    if progress_callback:
+        progress_callback.finish()
+    return np.array(records, dtype=DIFF_SERIES_DTYPE)
+
+def extract_keyframes_adaptive(
+    video_path, output_dir, diff_threshold=25, sample_rate=24, min_interval=0.5,
+    stillness_threshold=3, stillness_frames=5, progress_callback=None, sampling="auto",
+    analysis_size=None, stats=None, cancel_token=None, metric="mean", dedupe_distance=None,
+    dedupe_mode="skip", image_format=None, in_memory=None, coarse_rate=ADAPTIVE_COARSE_RATE,
+    refine_threshold=None, source=None
+):
+    """
+    extract_keyframes with adaptive sampling: the diffs come from scan_frame_diffs_adaptive
+    and the keyframes are saved as the scan reaches them, with the keyframe timestamps of
+    a full scan. Screen recordings and slide decks that are mostly still are analyzed in a
+    fraction of the time; on videos that keep changing it runs about as fast as
+    extract_keyframes, which it is when there is nothing to skip.
+    refine_threshold: see scan_frame_diffs_adaptive, None uses half of stillness_threshold
+    source: VideoCaptureSource of the scan, see scan_frame_diffs_adaptive
+    The other parameters are the ones of extract_keyframes.
+    """
+    stats = stats or NO_STATS
+    if refine_threshold is None:
+        refine_threshold = stillness_threshold / 2
+    source = source or VideoCaptureSource()
+    frame_interval, coarse_interval = adaptive_intervals(source.probe(video_path)[0], sample_rate, coarse_rate)
+    if coarse_interval == frame_interval:
+        return extract_keyframes(
+            video_path, output_dir, diff_threshold, sample_rate, min_interval, stillness_threshold,
+            stillness_frames, progress_callback, sampling, analysis_size, stats=stats,
+            cancel_token=cancel_token, metric=metric, dedupe_distance=dedupe_distance,
+            dedupe_mode=dedupe_mode, image_format=image_format, in_memory=in_memory, source=source
+        )
+    if not in_memory:
+        ensure_dir(output_dir)
+    detector = StillnessDetector(stillness_threshold, stillness_frames)
+    duplicates = KeyframeDeduplicator(dedupe_distance, dedupe_mode) if dedupe_distance is not None else None
+    last_keyframe_time = -min_interval
+    cap = None  # Decodes the keyframes the scan skipped over
+
+    def save_keyframe(frame_idx, timestamp, diff, frame):
+        nonlocal last_keyframe_time, cap
+        # The same rule as select_keyframes, applied as the series grows
+        if not detector.push(diff) or timestamp - last_keyframe_time < min_interval:
+            return
+        if frame is None:
+            cap = cap or source.open(video_path)
+            with stats.stage("seek"):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            stats.count("seeks")
+            with stats.stage("decode"):
+                ret, frame = cap.read()
+            stats.count("frames_decoded")
+            if not ret:
+                raise RuntimeError(f"Cannot read frame {frame_idx} of {video_path}")
+        writer.add(frame, timestamp)
+        last_keyframe_time = timestamp
+
+    try:
+        with KeyframeWriter(
+            output_dir, WRITER_THREADS, stats=stats, duplicates=duplicates, image_format=image_format,
+            in_memory=in_memory
+        ) as writer:
+            scan_frame_diffs_adaptive(
+                video_path, sample_rate, analysis_size, progress_callback, sampling, stats=stats,
+                cancel_token=cancel_token, metric=metric, coarse_rate=coarse_rate,
+                refine_threshold=refine_threshold, source=source, frame_callback=save_keyframe
+            )
+    finally:
+        if cap is not None:
+            cap.release()
+    return writer.keyframes
+
+def select_keyframes(series, stillness_threshold=3, stillness_frames=5, min_interval=0.5):
+    """
+    Return the positions in a diff series that extract_keyframes would pick as keyframes.
+    Vectorized equivalent of replaying the series through StillnessDetector: a frame is
+    still when the diffs of the window ending at it are all below stillness_threshold,
+    which a cumulative count of non-still diffs answers for every window at once.
+    """
+    diffs = np.asarray(series["diff"], dtype=np.float64)
+    n = len(diffs)
+    if stillness_frames < 1 or n < stillness_frames:
+        return []
+    moving = np.concatenate(([0], np.cumsum(~(diffs < stillness_threshold))))
+    still = np.zeros(n, dtype=bool)
+    still[stillness_frames - 1:] = moving[stillness_frames:] == moving[:n - stillness_frames + 1]
+    entering = still.copy()
+    entering[1:] &= ~still[:-1]
+
+    # min_interval depends on the previously accepted keyframe, one pass over the candidates
+    candidates = np.flatnonzero(entering)
+    timestamps = np.asarray(series["timestamp"])[candidates].tolist()
+    last_keyframe_time = -min_interval
+    selected = []
+    for i, timestamp in zip(candidates.tolist(), timestamps):
+        if (timestamp - last_keyframe_time) >= min_interval:
+            selected.append(i)
+            last_keyframe_time = timestamp
+    return selected
+
+def save_keyframes_at(
+    video_path, output_dir, frame_indices, timestamps, writer_threads=WRITER_THREADS, stats=None,
+    cancel_token=None, dedupe_distance=None, dedupe_mode="skip", image_format=None, in_memory=None
+):
+    """
+    Seek to and save the given frames as keyframes, return the keyframes list.
+    dedupe_distance, dedupe_mode: near-duplicate suppression, see extract_keyframes
+    image_format, in_memory: how the keyframes are kept, see extract_keyframes
+    """
+    stats = stats or NO_STATS
+    if not in_memory:
+        ensure_dir(output_dir)
+    duplicates = KeyframeDeduplicator(dedupe_distance, dedupe_mode) if dedupe_distance is not None else None
+    cap = cv2.VideoCapture(video_path)
+    try:
+        with KeyframeWriter(
+            output_dir, writer_threads, stats=stats, duplicates=duplicates, image_format=image_format,
+            in_memory=in_memory
+        ) as writer:
+            for frame_idx, timestamp in zip(frame_indices, timestamps):
+                if cancel_token:
+                    cancel_token.check()
+                with stats.stage("seek"):
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                stats.count("seeks")
+                with stats.stage("decode"):
+                    ret, frame = cap.read()
+                stats.count("frames_decoded")
+                if not ret:
+                    raise RuntimeError(f"Cannot read frame {frame_idx} of {video_path}")
+                writer.add(frame, timestamp)
+    finally:
+        cap.release()
+    return writer.keyframes
+
+def _scan_segment(
+    video_path, output_dir, segment_id, begin, start, end, frame_interval, params, progress_queue
+):
+    """
+    Segment worker: analyze sampled frames from begin to end and save every frame in
+    [start, end) that enters the still state as a candidate, ignoring min_interval.
+    The frames in [begin, start) only warm up the stillness window.
+    Returns a list of (frame_idx, timestamp, candidate_path, frame_hash); frame_hash is
+    the candidate's perceptual hash when deduplicating, None otherwise.
     """
+    cap = cv2.VideoCapture(video_path)
+    detector = StillnessDetector(params["stillness_threshold"], params["stillness_frames"], params["metric"])
+    candidates = []
+    reported = [0]
+
+    def report(current, total):
+        done = max(0, current - start)
+        if done - reported[0] >= SEGMENT_PROGRESS_STEP:
+            reported[0] = done
+            progress_queue.put((segment_id, done))
+
+    frames = iter_sampled_frames(
+        cap, frame_interval, params["sampling"], report, 0, start_frame=begin, end_frame=end
+    )
+    try:
+        for frame_idx, timestamp, frame in frames:
+            entering = detector.update(to_analysis_gray(frame, params["analysis_size"]))
+            if entering and frame_idx >= start:
+                image_format = params["image_format"]
+                out_path = os.path.join(output_dir, f".candidate_{frame_idx:09d}{image_format.extension}")
+                cv2.imwrite(out_path, frame, image_format.cv2_params())
+                frame_hash = None
+                if params["dedupe_distance"] is not None:
+                    frame_hash = KeyframeDeduplicator.frame_hash(frame)
+                candidates.append((frame_idx, timestamp, out_path, frame_hash))
+    finally:
+        cap.release()
+    progress_queue.put((segment_id, None))
+    return candidates
+
+def extract_keyframes_parallel(
+    video_path, output_dir, diff_threshold=25, sample_rate=24, min_interval=0.5,
+    stillness_threshold=3, stillness_frames=5, progress_callback=None, sampling="auto",
+    analysis_size=None, workers=None, segments=None, metric="mean", dedupe_distance=None,
+    dedupe_mode="skip", image_format=None
+):
+    """
+    Same result as extract_keyframes, computed by splitting the video into segments that
+    are analyzed by a pool of worker processes, each with its own VideoCapture.
+    Every segment starts stillness_frames + 1 sampled frames early so the stillness state
+    at its first frame matches a sequential run; min_interval is applied while stitching
+    the segment results back together in order.
+    workers: number of processes, defaults to the CPU count
+    segments: number of segments, defaults to workers
+    progress_callback: function(current_frame, total_frames), summed over all segments
+    dedupe_distance, dedupe_mode: near-duplicate suppression, applied while stitching
+    image_format: ImageFormat of the keyframe images, PNG by default
+    """
+    image_format = image_format or DEFAULT_IMAGE_FORMAT
+    progress_callback = throttled(progress_callback)
     ensure_dir(output_dir)
     cap = cv2.VideoCapture(video_path)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_interval = int(fps // sample_rate)
-    prev_gray = None
+    cap.release()
+    frame_interval = sample_interval(fps, sample_rate)
+    workers = workers or os.cpu_count() or 1
+    segments = segments or workers
+    # Segment boundaries fall on sampled frames so every segment samples the same frames
+    sampled_total = (total_frames + frame_interval - 1) // frame_interval
+    if segments <= 1 or sampled_total < segments * (stillness_frames + 1) * 2:
+        return extract_keyframes(
+            video_path, output_dir, diff_threshold, sample_rate, min_interval,
+            stillness_threshold, stillness_frames, progress_callback, sampling, analysis_size,
+            metric=metric, dedupe_distance=dedupe_distance, dedupe_mode=dedupe_mode,
+            image_format=image_format
+        )
+    bounds = [sampled_total * i // segments * frame_interval for i in range(segments)] + [None]
+    overlap = (stillness_frames + 1) * frame_interval
+    params = dict(
+        stillness_threshold=stillness_threshold, stillness_frames=stillness_frames,
+        sampling=sampling, analysis_size=analysis_size, metric=metric, dedupe_distance=dedupe_distance,
+        image_format=image_format
+    )
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(workers) as executor:
+        progress_queue = manager.Queue()
+        futures = [
+            executor.submit(
+                _scan_segment, video_path, output_dir, i, max(0, start - overlap), start, end,
+                frame_interval, params, progress_queue
+            )
+            for i, (start, end) in enumerate(zip(bounds, bounds[1:]))
+        ]
+        segment_progress = [0] * segments
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            while not progress_queue.empty():
+                segment_id, done = progress_queue.get()
+                if done is None:
+                    end = bounds[segment_id + 1] if bounds[segment_id + 1] is not None else total_frames
+                    done = end - bounds[segment_id]
+                segment_progress[segment_id] = done
+            if progress_callback:
+                progress_callback(min(sum(segment_progress), total_frames), total_frames)
+        results = [future.result() for future in futures]
+    if progress_callback:
+        progress_callback.finish()
+
     keyframes = []
-    frame_idx = 0
-    keyframe_idx = 0
     last_keyframe_time = -min_interval
-    stillness_queue = []
-    prev_state_still = False  # Is currently in still state
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_idx % frame_interval != 0:
-            frame_idx += 1
-            if progress_callback:
-                progress_callback(frame_idx, total_frames)
-            continue
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
-        if prev_gray is not None:
-            diff = get_frame_diff(prev_gray, gray)
-            stillness_queue.append(diff)
-            if len(stillness_queue) > stillness_frames:
-                stillness_queue.pop(0)
-        else:
-            stillness_queue.append(0)
-        prev_gray = gray
+    duplicates = KeyframeDeduplicator(dedupe_distance, dedupe_mode) if dedupe_distance is not None else None
+    for candidates in results:
+        for frame_idx, timestamp, candidate_path, frame_hash in candidates:
+            if (timestamp - last_keyframe_time) < min_interval:
+                os.remove(candidate_path)
+                continue
+            last_keyframe_time = timestamp
+            earlier = duplicates.find(frame_hash) if duplicates else None
+            if earlier is not None:
+                os.remove(candidate_path)
+                if dedupe_mode == "repeat":
+                    keyframes.append((keyframes[earlier][0], timestamp))
+                continue
+            out_path = os.path.join(
+                output_dir, keyframe_filename(len(keyframes), timestamp, image_format.extension)
+            )
+            os.replace(candidate_path, out_path)
+            if duplicates:
+                duplicates.add(frame_hash, len(keyframes))
+            keyframes.append((out_path, timestamp))
+    return keyframes
 
-        # Check if current state is still
-        is_still = (
-            len(stillness_queue) == stillness_frames
-            and all(d < stillness_threshold for d in stillness_queue)
-        )
+def load_keyframe_image(source):
+    """
+    Open a keyframe given as a file path, encoded image bytes, a BGR array (as returned by
+    OpenCV) or a PIL image.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(source))
+    if isinstance(source, np.ndarray):
+        if source.ndim == 2:
+            return Image.fromarray(source)
+        return Image.fromarray(cv2.cvtColor(source, cv2.COLOR_BGR2RGB))
+    return Image.open(source)
 
-        # Only extract keyframe when entering still state from moving state
-        if (
-            is_still
-            and not prev_state_still
-            and (timestamp - last_keyframe_time) >= min_interval
-        ):
-            out_path = os.path.join(output_dir, f"keyframe_{keyframe_idx:03d}_{timestamp:.2f}.png")
-            cv2.imwrite(out_path, frame)
-            keyframes.append((out_path, timestamp))
-            keyframe_idx += 1
-            last_keyframe_time = timestamp
+@lru_cache(maxsize=None)
+def load_label_font(size=80):
+    """Label font of the given size, loaded once per size and shared by all merges."""
+    try:
+        return ImageFont.truetype("Arial.ttf", size)
+    except Exception as e:
+        print("Failed to load Arial.ttf, fallback to default font:", e)
+        return ImageFont.load_default()
 
-        prev_state_still = is_still
-        frame_idx += 1
-        if progress_callback:
-            progress_callback(frame_idx, total_frames)
-    cap.release()
-    return keyframes
+def draw_timestamp_label(draw, x, y, w, h, timestamp, font, padding=20):
+    """Draw the timestamp of the tile at (x, y) sized w x h in its bottom-left corner."""
+    text = f"{timestamp:.2f}s"
+    bbox = draw.textbbox((0, 0), text, font=font)
+    text_w = bbox[2] - bbox[0]
+    text_h = bbox[3] - bbox[1]
+    # Add padding, move background and text up to avoid clipping
+    rect_y0 = y + h - text_h - padding * 2
+    rect_y1 = y + h
+    text_x = x + padding
+    text_y = y + h - text_h - padding
+    draw.rectangle(
+        [x, rect_y0, x + text_w + padding * 2, rect_y1],
+        fill=(0, 0, 0, 180)
+    )
+    draw.text(
+        (text_x, text_y),
+        text,
+        fill=(255, 255, 0),
+        font=font
+    )
 
-def merge_keyframes(keyframes, merged_path, max_per_row=8):
-    images = [Image.open(path) for path, _ in keyframes]
+def merge_keyframes(
+    keyframes, merged_path, max_per_row=8, stats=None, image_format=None, in_memory=None
+):
+    """
+    Paste all keyframes into one grid image with timestamp labels.
+    keyframes: list of (image, timestamp), image being a path, encoded bytes, BGR array or
+    PIL image, so the in-memory output of extract_keyframes can be merged directly.
+    Holds every keyframe and the whole grid in memory, see merge_keyframes_streaming
+    for a memory-bounded version.
+    stats: ExtractionStats recording the "merge_load", "merge_compose" and "merge_save" stages
+    image_format: ImageFormat of the merged image, by default the format follows the
+    extension of merged_path (PNG for in-memory bytes)
+    in_memory: "bytes" returns the encoded merged image and "arrays" its BGR array instead
+    of saving it to merged_path, which may then be None. Otherwise merged_path is returned.
+    """
+    if in_memory not in (None,) + IN_MEMORY_MODES:
+        raise ValueError(f"Unknown in-memory mode: {in_memory}")
+    stats = stats or NO_STATS
+    with stats.stage("merge_load"):
+        images = [load_keyframe_image(source) for source, _ in keyframes]
     if not images:
         print("No keyframes to merge.")
         return
@@ -96,40 +986,124 @@ def merge_keyframes(keyframes, merged_path, max_per_row=8):
     n = len(images)
     rows = (n + max_per_row - 1) // max_per_row
     cols = min(n, max_per_row)
-    merged_img = Image.new("RGB", (cols * w, rows * h), (0, 0, 0))
-    try:
-        font = ImageFont.truetype("Arial.ttf", 80)
-    except Exception as e:
-        print("Failed to load Arial.ttf, fallback to default font:", e)
-        font = ImageFont.load_default()
-    for idx, (img, (_, timestamp)) in enumerate(zip(images, keyframes)):
-        row = idx // max_per_row
-        col = idx % max_per_row
-        x = col * w
-        y = row * h
-        merged_img.paste(img, (x, y))
+    with stats.stage("merge_compose"):
+        merged_img = Image.new("RGB", (cols * w, rows * h), (0, 0, 0))
+        font = load_label_font(80)
         draw = ImageDraw.Draw(merged_img)
-        text = f"{timestamp:.2f}s"
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
-        # Add padding, move background and text up to avoid clipping
-        padding = 20
-        rect_y0 = y + h - text_h - padding * 2
-        rect_y1 = y + h
-        text_x = x + padding
-        text_y = y + h - text_h - padding
-        draw.rectangle(
-            [x, rect_y0, x + text_w + padding * 2, rect_y1],
-            fill=(0, 0, 0, 180)
-        )
-        draw.text(
-            (text_x, text_y),
-            text,
-            fill=(255, 255, 0),
-            font=font
-        )
-    merged_img.save(merged_path)
+        for idx, (img, (_, timestamp)) in enumerate(zip(images, keyframes)):
+            row = idx // max_per_row
+            col = idx % max_per_row
+            x = col * w
+            y = row * h
+            merged_img.paste(img, (x, y))
+            draw_timestamp_label(draw, x, y, w, h, timestamp, font)
+    if in_memory == "arrays":
+        return cv2.cvtColor(np.asarray(merged_img), cv2.COLOR_RGB2BGR)
+    with stats.stage("merge_save"):
+        if in_memory == "bytes":
+            buffer = io.BytesIO()
+            merged_img.save(buffer, **(image_format or DEFAULT_IMAGE_FORMAT).pil_params())
+            return buffer.getvalue()
+        merged_img.save(merged_path, **(image_format.pil_params() if image_format else {}))
+    stats.count("bytes_written", os.path.getsize(merged_path))
+    print(f"Merged image saved to {merged_path}")
+    return merged_path
+
+class PNGStreamWriter:
+    """
+    Writes an 8-bit RGB PNG a band of rows at a time, so only the current band has to
+    be in memory. The rows written must add up to the height given up front.
+    """
+    def __init__(self, path, width, height, compression=6):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compression)
+        self._file = open(path, "wb")
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def write_rows(self, rgb):
+        """Append an (rows, width, 3) uint8 array."""
+        rows = np.ascontiguousarray(rgb, dtype=np.uint8).reshape(len(rgb), self.width * 3)
+        # Each scanline starts with its filter type, 0 = None
+        scanlines = np.zeros((len(rows), self.width * 3 + 1), dtype=np.uint8)
+        scanlines[:, 1:] = rows
+        data = self._compressor.compress(scanlines.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG expects {self.height} rows, {self.rows_written} were written")
+            self._chunk(b"IDAT", self._compressor.flush())
+            self._chunk(b"IEND", b"")
+        finally:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def merge_keyframes_streaming(
+    keyframes, merged_path, max_per_row=8, scale=1.0, compression=6, stats=None
+):
+    """
+    Memory-bounded merge_keyframes: the grid is built one row of tiles at a time and
+    appended to a PNG file, so at most one keyframe and one row strip are held in memory.
+    With scale=1.0 the output matches merge_keyframes pixel for pixel.
+    keyframes: list of (image, timestamp), image being a path, BGR array or PIL image.
+    scale: size factor of the tiles, e.g. 0.25 for a thumbnail contact sheet
+    compression: zlib level of the PNG, lower is faster
+    stats: ExtractionStats recording the "merge_load", "merge_compose" and "merge_save" stages
+    """
+    stats = stats or NO_STATS
+    if not keyframes:
+        print("No keyframes to merge.")
+        return
+    first = load_keyframe_image(keyframes[0][0])
+    src_w, src_h = first.size
+    if first is not keyframes[0][0]:
+        first.close()
+    w, h = max(1, round(src_w * scale)), max(1, round(src_h * scale))
+    n = len(keyframes)
+    rows = (n + max_per_row - 1) // max_per_row
+    cols = min(n, max_per_row)
+    font = load_label_font(max(8, round(80 * scale)))
+    padding = max(2, round(20 * scale))
+    with PNGStreamWriter(merged_path, cols * w, rows * h, compression) as png:
+        for row in range(rows):
+            strip = Image.new("RGB", (cols * w, h), (0, 0, 0))
+            draw = ImageDraw.Draw(strip)
+            for col, (source, timestamp) in enumerate(keyframes[row * max_per_row:(row + 1) * max_per_row]):
+                with stats.stage("merge_load"):
+                    img = load_keyframe_image(source)
+                    tile = img
+                    if tile.size != (w, h):
+                        if tile is not source:
+                            tile.draft("RGB", (w, h))
+                        tile = tile.resize((w, h), Image.BOX)
+                with stats.stage("merge_compose"):
+                    strip.paste(tile, (col * w, 0))
+                    draw_timestamp_label(draw, col * w, 0, w, h, timestamp, font, padding)
+                if img is not source:
+                    img.close()
+            with stats.stage("merge_save"):
+                png.write_rows(np.asarray(strip))
+            strip.close()
+    stats.count("bytes_written", os.path.getsize(merged_path))
     print(f"Merged image saved to {merged_path}")
 
 if __name__ == "__main__":
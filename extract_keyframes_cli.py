@@ -0,0 +1,356 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from extraction_checkpoint import extract_keyframes_resumable
+from extraction_stats import ExtractionStats
+from frame_metrics import METRICS
+from frame_sources import FRAME_SOURCES
+from keyframe_summary import SUMMARY_INDEX_NAME, summary_files, write_summary
+from extract_keyframes import (
+    DEDUPE_MODES, FRAME_DIFF_THRESHOLD, FRAME_SAMPLE_RATE, IMAGE_FORMATS, MIN_KEYFRAME_INTERVAL,
+    ADAPTIVE_COARSE_RATE, MERGED_IMAGE_PATH, ImageFormat, extract_keyframes, extract_keyframes_adaptive,
+    extract_keyframes_parallel, merge_keyframes_streaming
+)
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+MANIFEST_NAME = "manifest.json"
+
+
+def add_param_arguments(parser):
+    parser.add_argument("--diff-threshold", type=float, default=FRAME_DIFF_THRESHOLD)
+    parser.add_argument("--sample-rate", type=int, default=FRAME_SAMPLE_RATE,
+                        help="Frames per second to sample")
+    parser.add_argument("--min-interval", type=float, default=MIN_KEYFRAME_INTERVAL,
+                        help="Minimum seconds between two keyframes")
+    parser.add_argument("--stillness-threshold", type=float, default=3,
+                        help="Largest change still counted as still, in the units of --metric")
+    parser.add_argument("--metric", choices=sorted(METRICS), default="mean",
+                        help="How the change between two sampled frames is measured")
+    parser.add_argument("--stillness-frames", type=int, default=5)
+    parser.add_argument("--analysis-size", type=int, default=None,
+                        help="Max width of the frames used for stillness detection")
+    parser.add_argument("--dedupe-distance", type=int, default=None,
+                        help="Treat keyframes within this many perceptual hash bits (0-64) of an "
+                             "earlier one as near-duplicates, e.g. 6")
+    parser.add_argument("--dedupe-mode", choices=DEDUPE_MODES, default="skip",
+                        help="Drop near-duplicates, or list them again with the earlier image")
+    parser.add_argument("--image-format", choices=IMAGE_FORMATS, default="png",
+                        help="Format of the keyframe images")
+    parser.add_argument("--quality", type=int, default=None,
+                        help="JPEG/WebP quality of the keyframes, 0-100")
+    parser.add_argument("--png-compression", type=int, default=None,
+                        help="PNG zlib level 0-9 of the keyframes and the merged image, lower is faster")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Scan at --coarse-rate first and analyze only the changing parts at --sample-rate")
+    parser.add_argument("--coarse-rate", type=float, default=ADAPTIVE_COARSE_RATE,
+                        help="Frames per second decoded where --adaptive skips still parts")
+    parser.add_argument("--source", choices=sorted(FRAME_SOURCES), default="opencv",
+                        help="Video decoder: OpenCV's VideoCapture or an ffmpeg subprocess (needs ffmpeg on PATH)")
+    parser.add_argument("--decoder-threads", type=int, default=None,
+                        help="Decoder threads, default lets the decoder decide")
+    parser.add_argument("--hwaccel", action="store_true",
+                        help="Decode with any available hardware decoder")
+    parser.add_argument("--max-per-row", type=int, default=5,
+                        help="Keyframes per row of the merged image")
+    parser.add_argument("--merge-scale", type=float, default=1.0,
+                        help="Tile size factor of the merged image, e.g. 0.25 for thumbnails")
+    parser.add_argument("--summary", action="store_true",
+                        help="Also write thumbnail, medium and full contact sheets with a tile index")
+
+
+def params_from_args(args):
+    return {
+        "diff_threshold": args.diff_threshold,
+        "sample_rate": args.sample_rate,
+        "min_interval": args.min_interval,
+        "stillness_threshold": args.stillness_threshold,
+        "stillness_frames": args.stillness_frames,
+        "analysis_size": args.analysis_size,
+        "metric": args.metric,
+        "dedupe_distance": args.dedupe_distance,
+        "dedupe_mode": args.dedupe_mode,
+        "image_format": args.image_format,
+        "quality": args.quality,
+        "png_compression": args.png_compression,
+        "adaptive": args.adaptive,
+        "coarse_rate": args.coarse_rate,
+        "source": args.source,
+        "decoder_threads": args.decoder_threads,
+        "hwaccel": args.hwaccel,
+        "max_per_row": args.max_per_row,
+        "merge_scale": args.merge_scale,
+        "summary": args.summary,
+    }
+
+
+def uses_default_source(params):
+    return params["source"] == "opencv" and params["decoder_threads"] is None and not params["hwaccel"]
+
+
+def make_source(params):
+    return FRAME_SOURCES[params["source"]](threads=params["decoder_threads"], hw_acceleration=params["hwaccel"])
+
+
+def find_videos(patterns, recursive=False):
+    """Expand directories and glob patterns into a sorted list of video files."""
+    videos = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+        for path in glob.glob(pattern, recursive=recursive):
+            if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS):
+                videos.add(os.path.abspath(path))
+    return sorted(videos)
+
+
+def output_dirs_for(videos, output_root):
+    """Map each video to its own output folder, named after the video file."""
+    stems = {}
+    for video in videos:
+        stem = os.path.splitext(os.path.basename(video))[0]
+        stems.setdefault(stem, []).append(video)
+    dirs = {}
+    for stem, paths in stems.items():
+        for video in paths:
+            name = stem
+            if len(paths) > 1:
+                name += "-" + hashlib.sha1(video.encode("utf-8")).hexdigest()[:8]
+            dirs[video] = os.path.join(output_root, name)
+    return dirs
+
+
+def source_info(video_path):
+    stat = os.stat(video_path)
+    return {"path": video_path, "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_up_to_date(video_path, output_dir, params):
+    manifest = load_manifest(output_dir)
+    if not manifest:
+        return False
+    if manifest.get("source") != source_info(video_path) or manifest.get("params") != params:
+        return False
+    outputs = [k["path"] for k in manifest.get("keyframes", [])]
+    if manifest.get("merged"):
+        outputs.append(manifest["merged"])
+    if manifest.get("summary"):
+        outputs.append(manifest["summary"])
+    return all(os.path.isfile(os.path.join(output_dir, name)) for name in outputs)
+
+
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def process_video(video_path, output_dir, params, parallel=False, resume=False, follow=False, workers=None):
+    """
+    Extract and merge the keyframes of one video and write its manifest. Returns the manifest.
+    resume: continue from the checkpoint of an interrupted or shorter earlier run
+    follow: keep analyzing frames appended to the video, implies resume
+    workers: processes of a parallel extraction, None uses the CPU count
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    resume = resume or follow
+    old_outputs = summary_files(output_dir) + glob.glob(os.path.join(output_dir, MERGED_IMAGE_PATH))
+    if not resume:
+        old_outputs += glob.glob(os.path.join(output_dir, "keyframe_*.*"))
+    # Drop the outputs of a previous run so they don't end up next to this one's manifest;
+    # the merged image and the summary are rebuilt from all keyframes when there are any
+    for old in old_outputs:
+        os.remove(old)
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    extract = extract_keyframes_parallel if parallel else extract_keyframes
+    extra = {"workers": workers} if parallel else {"stats": ExtractionStats()}
+    if resume:
+        extract = extract_keyframes_resumable
+        extra["follow"] = follow
+    elif params["adaptive"]:
+        extract = extract_keyframes_adaptive
+        extra["coarse_rate"] = params["coarse_rate"]
+    elif not parallel:
+        # Segment workers and checkpoint seeking need VideoCapture, see main
+        extra["source"] = make_source(params)
+    image_format = ImageFormat(params["image_format"], params["quality"], params["png_compression"])
+    start = time.perf_counter()
+    keyframes = extract(
+        video_path, output_dir,
+        diff_threshold=params["diff_threshold"],
+        sample_rate=params["sample_rate"],
+        min_interval=params["min_interval"],
+        stillness_threshold=params["stillness_threshold"],
+        stillness_frames=params["stillness_frames"],
+        analysis_size=params["analysis_size"],
+        metric=params["metric"],
+        dedupe_distance=params["dedupe_distance"],
+        dedupe_mode=params["dedupe_mode"],
+        image_format=image_format,
+        **extra
+    )
+    extract_seconds = time.perf_counter() - start
+    merged_path = os.path.join(output_dir, MERGED_IMAGE_PATH)
+    compression = 6 if params["png_compression"] is None else params["png_compression"]
+    merge_keyframes_streaming(
+        keyframes, merged_path, max_per_row=params["max_per_row"], scale=params["merge_scale"],
+        compression=compression, stats=extra.get("stats")
+    )
+    summary = None
+    if params["summary"] and keyframes:
+        # An unscaled merged image already is the full-size sheet
+        summary = write_summary(
+            keyframes, output_dir, max_per_row=params["max_per_row"], compression=compression,
+            full_sheet=MERGED_IMAGE_PATH if params["merge_scale"] == 1.0 else None, stats=extra.get("stats")
+        )
+    total_seconds = time.perf_counter() - start
+
+    manifest = {
+        "source": source_info(video_path),
+        "params": params,
+        "keyframes": [
+            {"path": os.path.basename(path), "timestamp": timestamp} for path, timestamp in keyframes
+        ],
+        "merged": MERGED_IMAGE_PATH if keyframes else None,
+        "summary": SUMMARY_INDEX_NAME if summary else None,
+        "stats": {
+            "frames": total_frames,
+            "fps": fps,
+            "duration": total_frames / fps if fps else 0,
+            "extract_seconds": extract_seconds,
+            "merge_seconds": total_seconds - extract_seconds,
+            "total_seconds": total_seconds,
+            "frames_per_second": total_frames / extract_seconds if extract_seconds > 0 else 0,
+        },
+    }
+    if "stats" in extra:
+        manifest["profile"] = extra["stats"].finish().to_dict()
+    write_manifest(output_dir, manifest)
+    return manifest
+
+
+def run_extract(args):
+    params = params_from_args(args)
+    manifest = process_video(
+        os.path.abspath(args.video), args.output, params, parallel=args.parallel,
+        resume=args.resume, follow=args.follow
+    )
+    stats = manifest["stats"]
+    print(f"{len(manifest['keyframes'])} keyframes in {stats['total_seconds']:.1f}s "
+          f"({stats['frames_per_second']:.0f} frames/s)")
+    return 0
+
+
+def run_batch(args):
+    params = params_from_args(args)
+    videos = find_videos(args.inputs, args.recursive)
+    if not videos:
+        print("No videos found.")
+        return 1
+    output_dirs = output_dirs_for(videos, args.output)
+    todo = [v for v in videos if args.force or not is_up_to_date(v, output_dirs[v], params)]
+    print(f"{len(videos)} videos found, {len(videos) - len(todo)} up to date, {len(todo)} to process")
+
+    start = time.perf_counter()
+    frames = 0
+    done = 0
+    failed = []
+    jobs = max(1, min(args.jobs, len(todo)))
+    # Videos processed at the same time share the CPUs between their segment workers
+    workers = max(1, (os.cpu_count() or 1) // jobs)
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = {
+            executor.submit(process_video, video, output_dirs[video], params, args.parallel, workers=workers): video
+            for video in todo
+        }
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                manifest = future.result()
+            except Exception as e:
+                failed.append(video)
+                print(f"FAILED {video}: {e}")
+                continue
+            done += 1
+            frames += manifest["stats"]["frames"]
+            print(f"[{done + len(failed)}/{len(todo)}] {video}: {len(manifest['keyframes'])} keyframes "
+                  f"in {manifest['stats']['total_seconds']:.1f}s")
+
+    elapsed = time.perf_counter() - start
+    if todo:
+        print(f"Processed {done} videos ({frames} frames) in {elapsed:.1f}s: "
+              f"{frames / elapsed:.0f} frames/s, {done / elapsed * 60:.1f} videos/min")
+    if failed:
+        print(f"{len(failed)} videos failed")
+        return 1
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Extract and merge video keyframes.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extract = subparsers.add_parser("extract", help="Process a single video")
+    extract.add_argument("video")
+    extract.add_argument("-o", "--output", default="keyframes", help="Output folder")
+    mode = extract.add_mutually_exclusive_group()
+    mode.add_argument("--parallel", action="store_true",
+                      help="Split the video into segments analyzed on all CPU cores")
+    mode.add_argument("--resume", action="store_true",
+                      help="Checkpoint the analysis and continue from an earlier run's checkpoint")
+    mode.add_argument("--follow", action="store_true",
+                      help="Like --resume, then keep analyzing frames appended to a growing recording")
+    add_param_arguments(extract)
+    extract.set_defaults(func=run_extract)
+
+    batch = subparsers.add_parser("batch", help="Process every video in directories or glob patterns")
+    batch.add_argument("inputs", nargs="+", help="Video directories or glob patterns")
+    batch.add_argument("-o", "--output", required=True,
+                       help="Output root, each video gets its own subfolder")
+    batch.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                       help="Videos processed at the same time")
+    batch.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    batch.add_argument("--force", action="store_true", help="Reprocess videos that are up to date")
+    batch.add_argument("--parallel", action="store_true",
+                       help="Also split each video into segments analyzed in parallel, "
+                            "the CPUs are shared between the --jobs videos")
+    add_param_arguments(batch)
+    batch.set_defaults(func=run_batch)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    params = params_from_args(args)
+    other_mode = args.parallel or getattr(args, "resume", False) or getattr(args, "follow", False)
+    if not uses_default_source(params) and (other_mode or args.adaptive):
+        parser.error("--source, --decoder-threads and --hwaccel only apply to sequential extraction")
+    if args.adaptive and other_mode:
+        parser.error("--adaptive can't be combined with --parallel, --resume or --follow")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
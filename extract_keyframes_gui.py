@@ -1,19 +1,21 @@
 import sys
 import os
 import json
-import threading
 import subprocess
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QFileDialog,
-    QProgressBar, QSlider, QLineEdit, QMessageBox, QGroupBox
+    QProgressBar, QSlider, QLineEdit, QMessageBox, QGroupBox, QListWidget, QListWidgetItem
 )
 from PyQt5.QtCore import Qt, pyqtSignal, QObject
 from PyQt5.QtGui import QIcon
-from extract_keyframes import extract_keyframes, merge_keyframes
+from extraction_progress import format_eta
+from extraction_jobs import (
+    JobManager, ACTIVE_STATES, QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED
+)
 
 VIDEO_EXTENSIONS = "Video Files (*.mp4 *.avi *.mov)"
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mov')
 DEFAULT_OUTPUT_DIR = os.path.join(os.path.expanduser("~"), "Downloads")
-MERGED_IMAGE_PATH = "keyframes_merged.png"
 CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".keyframe_extractor_config.json")
 DEFAULT_PARAMS = {
     "diff_threshold": 25,
@@ -44,45 +46,9 @@ def save_config(params):
     except Exception:
         pass
 
-class WorkerSignals(QObject):
-    progress = pyqtSignal(int)
-    status = pyqtSignal(str, str)
-    finished = pyqtSignal(str)
-
-class ExtractionWorker(threading.Thread):
-    def __init__(self, video_path, output_dir, params, signals):
-        super().__init__()
-        self.video_path = video_path
-        self.output_dir = output_dir
-        self.params = params
-        self.signals = signals
-
-    def run(self):
-        try:
-            def progress_callback(current, total):
-                percent = int((current / total) * 90) if total > 0 else 0
-                self.signals.progress.emit(percent)
-            self.signals.status.emit("Extracting keyframes...", "#0070c0")
-            keyframes = extract_keyframes(
-                self.video_path, self.output_dir,
-                diff_threshold=self.params["diff_threshold"],
-                sample_rate=self.params["sample_rate"],
-                min_interval=self.params["min_interval"] / 10.0,
-                stillness_threshold=self.params["stillness_threshold"],
-                stillness_frames=self.params["stillness_frames"],
-                progress_callback=progress_callback
-            )
-            self.signals.status.emit("Merging keyframes...", "#0070c0")
-            self.signals.progress.emit(95)
-            merged_path = os.path.join(self.output_dir, MERGED_IMAGE_PATH)
-            merge_keyframes(keyframes, merged_path, max_per_row=5)
-            self.signals.status.emit(f"Completed! Saved to: {self.output_dir}", "green")
-            self.signals.progress.emit(100)
-            self.signals.finished.emit(merged_path)
-        except Exception as e:
-            self.signals.status.emit("Error: " + str(e), "red")
-            self.signals.progress.emit(0)
-            self.signals.finished.emit("")
+class JobSignals(QObject):
+    # Emitted from JobManager worker threads, delivered on the GUI thread
+    job_updated = pyqtSignal(int)
 
 class KeyframeExtractorV2(QWidget):
     def __init__(self):
@@ -94,6 +60,11 @@ class KeyframeExtractorV2(QWidget):
         self.selected_file = ""
         self.output_dir = DEFAULT_OUTPUT_DIR
         self.merged_path = ""
+        self.current_job_id = None
+        self.job_items = {}
+        self.job_signals = JobSignals()
+        self.job_signals.job_updated.connect(self.on_job_updated)
+        self.jobs = JobManager(on_update=lambda job: self.job_signals.job_updated.emit(job.id))
         self.init_ui()
 
     def init_ui(self):
@@ -185,6 +156,9 @@ class KeyframeExtractorV2(QWidget):
         progress_layout.addWidget(self.progress_bar)
         self.percent_label = QLabel("0%")
         progress_layout.addWidget(self.percent_label)
+        self.eta_label = QLabel("")
+        self.eta_label.setStyleSheet("color: #7a8fa6;")
+        progress_layout.addWidget(self.eta_label)
         main_layout.addLayout(progress_layout)
 
         # Buttons
@@ -193,12 +167,28 @@ class KeyframeExtractorV2(QWidget):
         self.start_btn.clicked.connect(self.start_extraction)
         btn_layout.addWidget(self.start_btn)
 
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setEnabled(False)
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        btn_layout.addWidget(self.pause_btn)
+
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        btn_layout.addWidget(self.cancel_btn)
+
         self.open_btn = QPushButton("Open Merged Image")
         self.open_btn.setEnabled(False)
         self.open_btn.clicked.connect(self.open_merged_image)
         btn_layout.addWidget(self.open_btn)
         main_layout.addLayout(btn_layout)
 
+        # Job queue and history
+        self.job_list = QListWidget()
+        self.job_list.setMaximumHeight(120)
+        self.job_list.currentItemChanged.connect(self.on_job_selected)
+        main_layout.addWidget(self.job_list)
+
         # Footer
         footer = QLabel("© 2025 KeySnap Extractor")
         footer.setStyleSheet("color: #7a8fa6; font-size: 10px;")
@@ -219,25 +209,33 @@ class KeyframeExtractorV2(QWidget):
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
             urls = event.mimeData().urls()
-            if urls and urls[0].toLocalFile().lower().endswith(('.mp4', '.avi', '.mov')):
+            if any(url.toLocalFile().lower().endswith(VIDEO_SUFFIXES) for url in urls):
                 event.acceptProposedAction()
                 return
         event.ignore()
 
     def dropEvent(self, event):
         if event.mimeData().hasUrls():
-            urls = event.mimeData().urls()
-            if urls:
-                file_path = urls[0].toLocalFile()
-                if file_path.lower().endswith(('.mp4', '.avi', '.mov')):
-                    self.file_edit.setText(file_path)
-                    # 自動命名 output folder
-                    base = os.path.splitext(os.path.basename(file_path))[0]
-                    new_dir = os.path.join(os.path.expanduser("~"), "Downloads", base)
-                    self.out_edit.setText(new_dir)
-                    self.output_dir = new_dir
+            files = [url.toLocalFile() for url in event.mimeData().urls()]
+            files = [f for f in files if f.lower().endswith(VIDEO_SUFFIXES)]
+            if len(files) == 1:
+                self.file_edit.setText(files[0])
+                # 自動命名 output folder
+                new_dir = self.default_output_dir(files[0])
+                self.out_edit.setText(new_dir)
+                self.output_dir = new_dir
+            elif files:
+                # Several videos: queue them all, each with its own output folder
+                for file_path in files:
+                    output_dir = self.default_output_dir(file_path)
+                    if not self.jobs.find_active(file_path, output_dir):
+                        self.submit_job(file_path, output_dir)
         event.acceptProposedAction()
 
+    def default_output_dir(self, file_path):
+        base = os.path.splitext(os.path.basename(file_path))[0]
+        return os.path.join(os.path.expanduser("~"), "Downloads", base)
+
     def connect_param_signals(self):
         self.diff_slider.valueChanged.connect(lambda v: self._on_slider_change("diff_threshold", v, self.diff_label))
         self.sample_slider.valueChanged.connect(lambda v: self._on_slider_change("sample_rate", v, self.sample_label))
@@ -297,41 +295,101 @@ class KeyframeExtractorV2(QWidget):
         if not output_dir:
             QMessageBox.warning(self, "Error", "Please select an output folder.")
             return
+        if self.jobs.find_active(video_path, output_dir):
+            QMessageBox.warning(self, "Error", "This video is already queued for this output folder.")
+            return
+        self.save_params()
+        self.submit_job(video_path, output_dir)
+
+    def submit_job(self, video_path, output_dir):
         os.makedirs(output_dir, exist_ok=True)
-        self.status_label.setText("準備中...")
-        self.progress_bar.setValue(0)
-        self.percent_label.setText("0%")
-        self.open_btn.setEnabled(False)
         params = {
             "diff_threshold": self.diff_slider.value(),
             "sample_rate": self.sample_slider.value(),
-            "min_interval": self.min_interval_slider.value(),
+            "min_interval": self.min_interval_slider.value() / 10.0,
             "stillness_threshold": self.stillness_threshold_slider.value(),
             "stillness_frames": self.stillness_frames_slider.value()
         }
-        self.save_params()
-        self.worker_signals = WorkerSignals()
-        self.worker_signals.progress.connect(self.update_progress)
-        self.worker_signals.status.connect(self.update_status)
-        self.worker_signals.finished.connect(self.extraction_finished)
-        self.worker = ExtractionWorker(video_path, output_dir, params, self.worker_signals)
-        self.worker.start()
-
-    def update_progress(self, percent):
-        self.progress_bar.setValue(percent)
-        self.percent_label.setText(f"{percent}%")
+        item = QListWidgetItem()
+        self.job_list.addItem(item)
+        job = self.jobs.submit(video_path, output_dir, params)
+        self.job_items[job.id] = item
+        self.job_list.setCurrentItem(item)
+        self.on_job_updated(job.id)
+
+    def selected_job(self):
+        return self.jobs.get(self.current_job_id) if self.current_job_id else None
+
+    def on_job_selected(self, item, _previous=None):
+        for job_id, job_item in self.job_items.items():
+            if job_item is item:
+                self.current_job_id = job_id
+                self.show_job(self.jobs.get(job_id))
+
+    def toggle_pause(self):
+        job = self.selected_job()
+        if job and job.state == PAUSED:
+            self.jobs.resume(job)
+        elif job:
+            self.jobs.pause(job)
+
+    def cancel_job(self):
+        job = self.selected_job()
+        if job:
+            self.jobs.cancel(job)
+
+    def on_job_updated(self, job_id):
+        job = self.jobs.get(job_id)
+        item = self.job_items.get(job_id)
+        if not job or not item:
+            return
+        text = f"#{job.id} {job.name}: {job.state}"
+        if job.state in (RUNNING, PAUSED):
+            text += f" {job.progress}%"
+        elif job.state == DONE:
+            text += f", {len(job.keyframes)} keyframes"
+        elif job.state == FAILED:
+            text += f" ({job.error})"
+        item.setText(text)
+        if job_id == self.current_job_id:
+            self.show_job(job)
+        if job.state == DONE and job_id == self.current_job_id and not self.jobs.active_jobs():
+            message = f"Keyframe extraction and merging completed.\n\nMerged image saved at:\n{job.merged_path}"
+            if job.summary:
+                message += f"\n\nPerformance:\n{job.summary}"
+            QMessageBox.information(self, "Completed", message)
+
+    def show_job(self, job):
+        """Mirror the selected job in the status line, progress bar and buttons."""
+        self.progress_bar.setValue(job.progress)
+        self.percent_label.setText(f"{job.progress}%")
+        self.eta_label.setText(f"ETA {format_eta(job.eta)} · {job.fps:.0f} fps" if job.state == RUNNING else "")
+        if job.state == QUEUED:
+            self.update_status("Queued...", "#0070c0")
+        elif job.state == RUNNING:
+            stage = "Merging keyframes..." if job.progress >= 95 else "Extracting keyframes..."
+            self.update_status(stage, "#0070c0")
+        elif job.state == PAUSED:
+            self.update_status("Paused", "#0070c0")
+        elif job.state == DONE:
+            self.update_status(f"Completed! Saved to: {job.output_dir}", "green")
+        elif job.state == FAILED:
+            self.update_status("Error: " + job.error, "red")
+        elif job.state == CANCELLED:
+            self.update_status("Cancelled", "red")
+        self.pause_btn.setEnabled(job.state in (QUEUED, RUNNING, PAUSED))
+        self.pause_btn.setText("Resume" if job.state == PAUSED else "Pause")
+        self.cancel_btn.setEnabled(job.state in ACTIVE_STATES)
+        self.merged_path = job.merged_path if job.state == DONE else ""
+        self.open_btn.setEnabled(bool(self.merged_path) and os.path.isfile(self.merged_path))
 
     def update_status(self, text, color):
         self.status_label.setText(text)
         self.status_label.setStyleSheet(f"color: {color}; font-weight: bold;")
 
-    def extraction_finished(self, merged_path):
-        if merged_path and os.path.isfile(merged_path):
-            self.merged_path = merged_path
-            self.open_btn.setEnabled(True)
-            QMessageBox.information(self, "Completed", f"Keyframe extraction and merging completed.\n\nMerged image saved at:\n{merged_path}")
-        else:
-            self.open_btn.setEnabled(False)
+    def closeEvent(self, event):
+        self.jobs.cancel_all()
+        super().closeEvent(event)
 
     def open_merged_image(self):
         if self.merged_path and os.path.isfile(self.merged_path):
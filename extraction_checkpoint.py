@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+
+import cv2
+
+from extract_keyframes import (
+    DECODE_QUEUE_SIZE, WRITER_THREADS, KeyframeDeduplicator, KeyframeWriter, StillnessDetector,
+    ensure_dir, iter_in_background, iter_sampled_frames, sample_interval, to_analysis_gray
+)
+from extraction_progress import throttled
+from extraction_stats import NO_STATS
+
+CHECKPOINT_NAME = ".keyframes_checkpoint.json"
+CHECKPOINT_VERSION = 2
+CHECKPOINT_INTERVAL = 30.0  # Seconds between two checkpoints
+FOLLOW_POLL_INTERVAL = 2.0  # Seconds between two looks for appended frames in follow mode
+FOLLOW_IDLE_TIMEOUT = 60.0  # Follow mode stops after this many seconds without new frames
+
+
+def gray_fingerprint(gray):
+    """Identity of an analysis frame, used to check that a resumed run sees the same frame."""
+    digest = hashlib.sha1(f"{gray.shape}:{gray.dtype}".encode("utf-8"))
+    digest.update(gray.tobytes())
+    return digest.hexdigest()
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically, a crash mid-write keeps the previous one."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def restore_previous_frame(cap, frame_idx, analysis_size, fingerprint):
+    """
+    Decode the last analyzed frame again by seeking to it. Returns its analysis frame, or
+    None when the video no longer has that exact frame (replaced file, inexact seeking).
+    """
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+    ret, frame = cap.read()
+    if not ret:
+        return None
+    gray = to_analysis_gray(frame, analysis_size)
+    return gray if gray_fingerprint(gray) == fingerprint else None
+
+
+def extract_keyframes_resumable(
+    video_path, output_dir, diff_threshold=25, sample_rate=24, min_interval=0.5,
+    stillness_threshold=3, stillness_frames=5, progress_callback=None, sampling="auto",
+    analysis_size=None, decode_queue_size=DECODE_QUEUE_SIZE, writer_threads=WRITER_THREADS,
+    stats=None, cancel_token=None, checkpoint_interval=CHECKPOINT_INTERVAL, follow=False,
+    poll_interval=FOLLOW_POLL_INTERVAL, idle_timeout=FOLLOW_IDLE_TIMEOUT, metric="mean",
+    dedupe_distance=None, dedupe_mode="skip", image_format=None
+):
+    """
+    Same result as extract_keyframes, but the analyzer state (position, fingerprint of the
+    previous analysis frame, stillness window, last keyframe time, keyframe index and the
+    hashes of the near-duplicate index) is
+    checkpointed to output_dir every checkpoint_interval seconds, when cancelled and at
+    the end. A later call with the same parameters resumes from the checkpoint by seeking,
+    so a crashed run continues where it stopped and a recording that has grown since
+    only has its new frames analyzed. A checkpoint that doesn't match the video or the
+    parameters is ignored and the extraction starts over.
+    follow: keep polling the video for appended frames (e.g. a live capture file) every
+    poll_interval seconds, stop after idle_timeout seconds without new frames
+    The other parameters are the ones of extract_keyframes.
+    """
+    stats = stats or NO_STATS
+    progress_callback = throttled(progress_callback)
+    ensure_dir(output_dir)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_NAME)
+    params = {
+        "video_path": os.path.abspath(video_path),
+        "sample_rate": sample_rate,
+        "min_interval": min_interval,
+        "stillness_threshold": stillness_threshold,
+        "stillness_frames": stillness_frames,
+        "analysis_size": analysis_size,
+        "metric": metric,
+        "dedupe_distance": dedupe_distance,
+        "dedupe_mode": dedupe_mode,
+        "image_format": image_format.to_dict() if image_format else None,
+    }
+    detector = StillnessDetector(stillness_threshold, stillness_frames, metric)
+    last_keyframe_time = -min_interval
+    prev_frame_idx = -1
+    prev_gray = None
+    keyframes = []
+    duplicate_entries = []
+
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_interval = sample_interval(fps, sample_rate)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint["params"] == params:
+        prev_gray = restore_previous_frame(cap, checkpoint["prev_frame_idx"], analysis_size, checkpoint["prev_gray"])
+        if prev_gray is not None:
+            detector.prev_signature = detector.metric.signature(prev_gray)
+            detector.stillness_queue = checkpoint["stillness_queue"]
+            detector.prev_state_still = checkpoint["prev_state_still"]
+            last_keyframe_time = checkpoint["last_keyframe_time"]
+            prev_frame_idx = checkpoint["prev_frame_idx"]
+            keyframes = [tuple(keyframe) for keyframe in checkpoint["keyframes"]]
+            duplicate_entries = checkpoint["duplicates"]
+            print(f"Resuming {video_path} after frame {prev_frame_idx}")
+        else:
+            print("Checkpoint doesn't match the video, starting over")
+    elif checkpoint:
+        print("Checkpoint was made with other parameters, starting over")
+    cap.release()
+
+    def checkpoint_state(writer):
+        # Keyframes referenced by the checkpoint must be on disk
+        writer.flush()
+        with stats.stage("checkpoint"):
+            save_checkpoint(checkpoint_path, {
+                "version": CHECKPOINT_VERSION,
+                "params": params,
+                "prev_frame_idx": prev_frame_idx,
+                "prev_gray": gray_fingerprint(prev_gray) if prev_gray is not None else None,
+                "stillness_queue": [float(d) for d in detector.stillness_queue],
+                "prev_state_still": detector.prev_state_still,
+                "last_keyframe_time": last_keyframe_time,
+                "keyframe_idx": len(writer.keyframes),
+                "keyframes": writer.keyframes,
+                "duplicates": writer.duplicates.entries if writer.duplicates else [],
+                "time": time.time(),
+            })
+
+    duplicates = None
+    if dedupe_distance is not None:
+        duplicates = KeyframeDeduplicator(dedupe_distance, dedupe_mode, duplicate_entries)
+    with KeyframeWriter(
+        output_dir, writer_threads, stats=stats, keyframes=keyframes, duplicates=duplicates,
+        image_format=image_format
+    ) as writer:
+        idle_since = time.monotonic()
+        last_checkpoint = time.monotonic()
+        while True:
+            cap = cv2.VideoCapture(video_path)
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            frames = iter_sampled_frames(
+                cap, frame_interval, sampling, progress_callback, total_frames,
+                start_frame=prev_frame_idx + 1, stats=stats, cancel_token=cancel_token
+            )
+            if decode_queue_size > 0:
+                frames = iter_in_background(frames, decode_queue_size)
+            analyzed = 0
+            try:
+                for frame_idx, timestamp, frame in frames:
+                    stats.count("frames_analyzed")
+                    with stats.stage("convert"):
+                        gray = to_analysis_gray(frame, analysis_size)
+                    with stats.stage("diff"):
+                        entering = detector.update(gray)
+                    if entering and (timestamp - last_keyframe_time) >= min_interval:
+                        writer.add(frame, timestamp)
+                        last_keyframe_time = timestamp
+                    prev_frame_idx = frame_idx
+                    prev_gray = gray
+                    analyzed += 1
+                    if time.monotonic() - last_checkpoint >= checkpoint_interval:
+                        checkpoint_state(writer)
+                        last_checkpoint = time.monotonic()
+            finally:
+                frames.close()
+                cap.release()
+                # Also reached when cancelled or failing, so the next run resumes from here
+                checkpoint_state(writer)
+                last_checkpoint = time.monotonic()
+            if not follow:
+                break
+            if analyzed:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= idle_timeout:
+                break
+            if cancel_token:
+                cancel_token.check()
+            time.sleep(poll_interval)
+    if progress_callback:
+        progress_callback.finish()
+    return writer.keyframes
@@ -0,0 +1,209 @@
+import itertools
+import os
+import queue
+import threading
+import time
+
+from extract_keyframes import MERGED_IMAGE_PATH, merge_keyframes
+from extraction_progress import ProgressReporter
+from extraction_stats import ExtractionStats
+from keyframe_cache import extract_keyframes_cached
+
+# Each extraction already keeps a decoder thread and the keyframe writers busy
+DEFAULT_MAX_CONCURRENT = max(1, (os.cpu_count() or 1) // 4)
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATES = (QUEUED, RUNNING, PAUSED)
+
+
+class ExtractionCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """
+    Cooperative cancel/pause flag checked by the extraction loops (see iter_sampled_frames).
+    check() blocks while paused and raises ExtractionCancelled once cancelled.
+    """
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def wait(self):
+        """Block while paused."""
+        self._running.wait()
+
+    def check(self):
+        self.wait()
+        if self._cancelled.is_set():
+            raise ExtractionCancelled()
+
+
+class Job:
+    """One queued extraction; params holds the extract_keyframes keyword arguments."""
+    def __init__(self, job_id, video_path, output_dir, params):
+        self.id = job_id
+        self.video_path = video_path
+        self.output_dir = output_dir
+        self.params = params
+        self.token = CancelToken()
+        self.state = QUEUED
+        self.progress = 0
+        self.eta = None
+        self.fps = 0.0
+        self.keyframes = []
+        self.merged_path = ""
+        self.error = ""
+        self.summary = ""
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def name(self):
+        return os.path.basename(self.video_path)
+
+
+def run_extraction_job(job, progress_callback):
+    """Default job runner: cached keyframe extraction followed by the merge."""
+    stats = ExtractionStats()
+    job.keyframes = extract_keyframes_cached(
+        job.video_path, job.output_dir, progress_callback=progress_callback,
+        cancel_token=job.token, stats=stats, **job.params
+    )
+    job.token.check()
+    job.progress = 95
+    merged_path = os.path.join(job.output_dir, MERGED_IMAGE_PATH)
+    merge_keyframes(job.keyframes, merged_path, max_per_row=5, stats=stats)
+    job.merged_path = merged_path
+    job.summary = stats.finish().summary()
+
+
+class JobManager:
+    """
+    Runs queued extraction jobs on at most max_concurrent worker threads and keeps every
+    submitted job in history. on_update(job) is called from the worker threads whenever
+    a job changes state or makes progress.
+    """
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT, on_update=None, run_job=run_extraction_job):
+        self.max_concurrent = max_concurrent
+        self.on_update = on_update
+        self.run_job = run_job
+        self.history = []
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+
+    def submit(self, video_path, output_dir, params):
+        job = Job(next(self._ids), video_path, output_dir, params)
+        with self._lock:
+            self.history.append(job)
+            if len(self._workers) < self.max_concurrent:
+                worker = threading.Thread(target=self._work, daemon=True)
+                self._workers.append(worker)
+                worker.start()
+        self._queue.put(job)
+        self._notify(job)
+        return job
+
+    def get(self, job_id):
+        return next((job for job in self.history if job.id == job_id), None)
+
+    def find_active(self, video_path, output_dir):
+        return next(
+            (job for job in self.history
+             if job.state in ACTIVE_STATES and job.video_path == video_path and job.output_dir == output_dir),
+            None
+        )
+
+    def active_jobs(self):
+        return [job for job in self.history if job.state in ACTIVE_STATES]
+
+    def cancel(self, job):
+        job.token.cancel()
+        if job.state in (QUEUED, PAUSED) and not job.started:
+            job.state = CANCELLED
+            self._notify(job)
+
+    def pause(self, job):
+        if job.state in (QUEUED, RUNNING):
+            job.token.pause()
+            job.state = PAUSED
+            self._notify(job)
+
+    def resume(self, job):
+        if job.state == PAUSED:
+            job.token.resume()
+            job.state = RUNNING if job.started else QUEUED
+            if not job.started:
+                # Workers drop jobs that are paused while queued, queue it again
+                self._queue.put(job)
+            self._notify(job)
+
+    def cancel_all(self):
+        for job in self.active_jobs():
+            self.cancel(job)
+
+    def _notify(self, job):
+        if self.on_update:
+            self.on_update(job)
+
+    def _claim(self, job):
+        with self._lock:
+            if job.started or job.token.cancelled or job.token.paused:
+                return False
+            job.started = time.time()
+            return True
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if self._claim(job):
+                self._run(job)
+
+    def _run(self, job):
+        def on_progress(current, total, eta, fps):
+            job.progress = int((current / total) * 90) if total > 0 else 0
+            job.eta = eta
+            job.fps = fps
+            self._notify(job)
+
+        job.state = RUNNING
+        self._notify(job)
+        try:
+            self.run_job(job, ProgressReporter(detail_callback=on_progress))
+            job.state = DONE
+            job.progress = 100
+        except ExtractionCancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+        job.finished = time.time()
+        self._notify(job)
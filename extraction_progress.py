@@ -0,0 +1,81 @@
+import time
+
+PROGRESS_MIN_INTERVAL = 0.1  # Seconds between two forwarded progress updates
+PROGRESS_MIN_PERCENT = 0.5   # Percent of the total the progress must move before forwarding
+
+
+class ProgressReporter:
+    """
+    Coalesces progress_callback(current, total) calls before they reach the callback:
+    an update is forwarded once at least min_interval seconds have passed and the
+    progress moved by min_percent of the total since the last forwarded one. The final
+    update (current >= total) and finish() are always forwarded.
+    It also tracks the processing rate (frames per second) and the ETA in seconds;
+    detail_callback(current, total, eta, fps) receives them, eta is None while unknown.
+    A reporter is itself a progress_callback and can be passed wherever one is expected.
+    """
+    def __init__(
+        self, callback=None, min_interval=PROGRESS_MIN_INTERVAL, min_percent=PROGRESS_MIN_PERCENT,
+        detail_callback=None, clock=time.monotonic
+    ):
+        self.callback = callback
+        self.detail_callback = detail_callback
+        self.min_interval = min_interval
+        self.min_percent = min_percent
+        self.clock = clock
+        self.fps = 0.0
+        self.eta = None
+        self._start = None
+        self._start_current = 0
+        self._last_time = None
+        self._last_forwarded = None
+        self._pending = None
+
+    def __call__(self, current, total):
+        now = self.clock()
+        if self._start is None:
+            self._start = now
+            self._start_current = current
+        self._pending = (current, total)
+        if total <= 0 or current < total:
+            if self._last_time is not None and now - self._last_time < self.min_interval:
+                return
+            last_current = self._last_forwarded[0] if self._last_forwarded else self._start_current
+            if total > 0 and (current - last_current) * 100.0 / total < self.min_percent:
+                return
+        self._forward(now)
+
+    def finish(self):
+        """Forward the latest update if it was held back."""
+        if self._pending is not None and self._pending != self._last_forwarded:
+            self._forward(self.clock())
+
+    def _forward(self, now):
+        current, total = self._pending
+        elapsed = now - self._start
+        if elapsed > 0:
+            self.fps = (current - self._start_current) / elapsed
+        if total > 0 and self.fps > 0:
+            self.eta = max(0.0, (total - current) / self.fps)
+        self._last_time = now
+        self._last_forwarded = self._pending
+        if self.callback:
+            self.callback(current, total)
+        if self.detail_callback:
+            self.detail_callback(current, total, self.eta, self.fps)
+
+
+def throttled(progress_callback):
+    """Wrap a plain progress_callback in a ProgressReporter, pass reporters and None through."""
+    if progress_callback is None or isinstance(progress_callback, ProgressReporter):
+        return progress_callback
+    return ProgressReporter(progress_callback)
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
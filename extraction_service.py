@@ -0,0 +1,475 @@
+"""
+Local HTTP service extracting keyframe sheets on demand.
+
+    python extraction_service.py --output service_output --port 8765 --workers 2
+
+Endpoints (JSON unless noted):
+    POST /jobs                   {"video": "/path/to/video.mp4", "params": {...}} submits a job
+    GET  /jobs                   every job of this service run
+    GET  /jobs/<id>              state, progress and, once done, the keyframes
+    GET  /jobs/<id>/merged       the merged keyframe image (image/png)
+    GET  /health
+
+Jobs run on a bounded process pool. A request is identified by the SHA-256 of the
+video's content plus its normalized parameters: submitting the same video and
+parameters again (from any path) returns the queued, running or finished job instead
+of starting another one, and results already in the output folder from an earlier
+run are served without extracting again. ServiceClient talks to a running service,
+run_local() starts one in-process on a free port.
+"""
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from extract_keyframes import (
+    DEDUPE_MODES, FRAME_SAMPLE_RATE, IMAGE_FORMATS, MERGED_IMAGE_PATH, MIN_KEYFRAME_INTERVAL,
+    ImageFormat, extract_keyframes, merge_keyframes
+)
+from extraction_jobs import DEFAULT_MAX_CONCURRENT, DONE, FAILED, QUEUED, RUNNING
+from extraction_progress import ProgressReporter
+from extraction_stats import ExtractionStats
+from frame_metrics import METRICS
+
+RESULT_NAME = "result.json"
+HASH_CHUNK = 4 * 1024 * 1024  # Bytes read at a time while hashing a video
+DEFAULT_PORT = 8765
+MAX_REQUEST_BYTES = 64 * 1024
+
+# Parameters a request may set, with their defaults
+DEFAULT_PARAMS = {
+    "sample_rate": FRAME_SAMPLE_RATE,
+    "min_interval": MIN_KEYFRAME_INTERVAL,
+    "stillness_threshold": 3,
+    "stillness_frames": 5,
+    "analysis_size": None,
+    "metric": "mean",
+    "dedupe_distance": None,
+    "dedupe_mode": "skip",
+    "image_format": "png",
+    "quality": None,
+    "png_compression": None,
+    "max_per_row": 5,
+}
+
+
+def normalize_params(params):
+    """Fill in the defaults of DEFAULT_PARAMS, raise ValueError on unknown or invalid values."""
+    unknown = set(params or {}) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {', '.join(sorted(unknown))}")
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    if params["metric"] not in METRICS:
+        raise ValueError(f"Unknown frame metric: {params['metric']}")
+    if params["dedupe_mode"] not in DEDUPE_MODES:
+        raise ValueError(f"Unknown dedupe mode: {params['dedupe_mode']}")
+    if params["image_format"] not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {params['image_format']}")
+    if not isinstance(params["sample_rate"], int) or params["sample_rate"] < 1:
+        raise ValueError("sample_rate must be a positive integer")
+    return params
+
+
+def request_key(content_hash, params):
+    """Key of a request: the video content hash and its normalized parameters."""
+    key = json.dumps([content_hash, params], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class ContentHasher:
+    """
+    SHA-256 of whole video files, remembered per (path, size, mtime) so resubmitting an
+    unchanged file doesn't read it again.
+    """
+    def __init__(self):
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, video_path):
+        stat = os.stat(video_path)
+        identity = (os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if identity in self._known:
+                return self._known[identity]
+        digest = hashlib.sha256()
+        with open(video_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+        with self._lock:
+            self._known[identity] = digest.hexdigest()
+        return self._known[identity]
+
+
+def load_result(output_dir):
+    try:
+        with open(os.path.join(output_dir, RESULT_NAME), "r") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    names = [keyframe["path"] for keyframe in result.get("keyframes", [])]
+    if result.get("merged"):
+        names.append(result["merged"])
+    if not all(os.path.isfile(os.path.join(output_dir, name)) for name in names):
+        return None
+    return result
+
+
+def run_service_job(job_id, video_path, output_dir, params, progress_queue):
+    """Pool worker: extract and merge the keyframes of one job, write and return its result."""
+    def on_progress(current, total, eta, fps):
+        progress_queue.put((job_id, current, total, eta, fps))
+
+    progress_queue.put((job_id, 0, 0, None, 0.0))
+    os.makedirs(output_dir, exist_ok=True)
+    stats = ExtractionStats()
+    start = time.perf_counter()
+    keyframes = extract_keyframes(
+        video_path, output_dir,
+        sample_rate=params["sample_rate"],
+        min_interval=params["min_interval"],
+        stillness_threshold=params["stillness_threshold"],
+        stillness_frames=params["stillness_frames"],
+        progress_callback=ProgressReporter(detail_callback=on_progress),
+        analysis_size=params["analysis_size"],
+        stats=stats,
+        metric=params["metric"],
+        dedupe_distance=params["dedupe_distance"],
+        dedupe_mode=params["dedupe_mode"],
+        image_format=ImageFormat(params["image_format"], params["quality"], params["png_compression"]),
+    )
+    merged_path = os.path.join(output_dir, MERGED_IMAGE_PATH)
+    if keyframes:
+        merge_keyframes(keyframes, merged_path, max_per_row=params["max_per_row"], stats=stats)
+    result = {
+        "params": params,
+        "keyframes": [
+            {"path": os.path.basename(path), "timestamp": timestamp} for path, timestamp in keyframes
+        ],
+        "merged": MERGED_IMAGE_PATH if keyframes else None,
+        "seconds": time.perf_counter() - start,
+        "profile": stats.finish().to_dict(),
+    }
+    path = os.path.join(output_dir, RESULT_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(result, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return result
+
+
+class ServiceJob:
+    def __init__(self, job_id, key, video_path, output_dir, params):
+        self.id = job_id
+        self.key = key
+        self.video_path = video_path
+        self.output_dir = output_dir
+        self.params = params
+        self.state = QUEUED
+        self.progress = 0
+        self.eta = None
+        self.fps = 0.0
+        self.result = None
+        self.error = ""
+        self.cached = False
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "key": self.key,
+            "video": self.video_path,
+            "output_dir": self.output_dir,
+            "params": self.params,
+            "state": self.state,
+            "progress": self.progress,
+            "eta": self.eta,
+            "fps": self.fps,
+            "cached": self.cached,
+            "error": self.error,
+            "result": self.result,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class ExtractionService:
+    """
+    Job bookkeeping of the HTTP service: runs submitted jobs on at most max_workers
+    processes, each job's files go to output_root/<request key>.
+    """
+    def __init__(self, output_root, max_workers=DEFAULT_MAX_CONCURRENT):
+        self.output_root = output_root
+        self.max_workers = max_workers
+        self.jobs = {}
+        self._by_key = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._hash = ContentHasher()
+        self._manager = multiprocessing.Manager()
+        self._progress_queue = self._manager.Queue()
+        self._executor = ProcessPoolExecutor(max_workers)
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def submit(self, video_path, params=None):
+        """Return the job for video_path and params, an existing one when the request is known."""
+        params = normalize_params(params)
+        if not os.path.isfile(video_path):
+            raise ValueError(f"Video not found: {video_path}")
+        key = request_key(self._hash(video_path), params)
+        with self._lock:
+            job = self._by_key.get(key)
+            # Failed jobs are retried, everything else is shared
+            if job and job.state != FAILED:
+                return job
+            output_dir = os.path.join(self.output_root, key[:16])
+            job = ServiceJob(next(self._ids), key, os.path.abspath(video_path), output_dir, params)
+            self.jobs[job.id] = job
+            self._by_key[key] = job
+            result = load_result(output_dir)
+            if result is not None:
+                job.state = DONE
+                job.progress = 100
+                job.result = result
+                job.cached = True
+                job.finished = time.time()
+                return job
+        future = self._executor.submit(
+            run_service_job, job.id, job.video_path, output_dir, params, self._progress_queue
+        )
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def merged_path(self, job):
+        if job.state != DONE or not job.result or not job.result["merged"]:
+            return None
+        return os.path.join(job.output_dir, job.result["merged"])
+
+    def _finish(self, job, future):
+        try:
+            job.result = future.result()
+            job.state = DONE
+            job.progress = 100
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+        job.finished = time.time()
+
+    def _listen(self):
+        while True:
+            try:
+                update = self._progress_queue.get()
+            except (EOFError, OSError):
+                return
+            if update is None:
+                return
+            job_id, current, total, eta, fps = update
+            job = self.jobs.get(job_id)
+            if job and job.state in (QUEUED, RUNNING):
+                job.state = RUNNING
+                job.progress = int(current * 100 / total) if total > 0 else 0
+                job.eta = eta
+                job.fps = fps
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._progress_queue.put(None)
+        self._listener.join()
+        self._manager.shutdown()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "KeyframeService/1.0"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, message):
+        self.send_json(status, {"error": message})
+
+    def find_job(self, parts):
+        try:
+            job = self.service.get(int(parts[1]))
+        except ValueError:
+            job = None
+        if job is None:
+            self.send_error_json(404, "Unknown job")
+        return job
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip("/").split("/")
+        if parts == ["health"]:
+            self.send_json(200, {"ok": True})
+        elif parts == ["jobs"]:
+            self.send_json(200, [job.to_dict() for job in list(self.service.jobs.values())])
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self.find_job(parts)
+            if job:
+                self.send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "merged":
+            job = self.find_job(parts)
+            if not job:
+                return
+            path = self.service.merged_path(job)
+            if path is None:
+                self.send_error_json(409, f"Job is {job.state}, no merged image")
+                return
+            with open(path, "rb") as f:
+                data = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self.send_error_json(404, "Not found")
+
+    def do_POST(self):
+        if urlparse(self.path).path.strip("/") != "jobs":
+            self.send_error_json(404, "Not found")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_REQUEST_BYTES:
+            self.send_error_json(413, "Request too large")
+            return
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            job = self.service.submit(body["video"], body.get("params"))
+        except KeyError:
+            self.send_error_json(400, "Missing 'video'")
+            return
+        except (ValueError, TypeError, OSError) as e:
+            self.send_error_json(400, str(e))
+            return
+        self.send_json(200 if job.state == DONE else 202, job.to_dict())
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+    """ThreadingHTTPServer serving service, port 0 picks a free port (see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class ServiceClient:
+    """Minimal client of the service, standard library only."""
+    def __init__(self, base_url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read(), response.headers.get("Content-Type", "")
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read())["error"]
+            except (ValueError, KeyError):
+                message = e.reason
+            raise ServiceError(e.code, message) from None
+
+    def _json(self, method, path, body=None):
+        return json.loads(self._request(method, path, body)[0])
+
+    def submit(self, video_path, **params):
+        return self._json("POST", "/jobs", {"video": os.path.abspath(video_path), "params": params})
+
+    def status(self, job_id):
+        return self._json("GET", f"/jobs/{job_id}")
+
+    def jobs(self):
+        return self._json("GET", "/jobs")
+
+    def merged_image(self, job_id):
+        """PNG bytes of a finished job's merged image."""
+        return self._request("GET", f"/jobs/{job_id}/merged")[0]
+
+    def wait(self, job_id, timeout=None, poll_interval=0.5):
+        """Poll until the job is done or failed, return its final status."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            job = self.status(job_id)
+            if job["state"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {job_id} still {job['state']} after {timeout}s")
+            time.sleep(poll_interval)
+
+
+@contextlib.contextmanager
+def run_local(output_root, max_workers=1):
+    """Run a service on a free local port in a background thread, yield a ServiceClient for it."""
+    service = ExtractionService(output_root, max_workers)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address[:2]
+        yield ServiceClient(f"http://{host}:{port}")
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP service extracting keyframe sheets.")
+    parser.add_argument("-o", "--output", default="service_output", help="Folder the job results go to")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_CONCURRENT,
+                        help="Videos extracted at the same time")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    service = ExtractionService(args.output, args.workers)
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_address[1]} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process in bytes, None where it can't be measured."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class ExtractionStats:
+    """
+    Opt-in instrumentation for extract_keyframes and merge_keyframes: cumulative time per
+    stage, frame counters, bytes written and peak RSS. Stages run on the decoder and
+    writer threads too, so the recording is thread-safe and stage times can add up to
+    more than the wall time. With trace=True every stage span is also kept as a Chrome
+    trace event, see dump_chrome_trace.
+    frames_decoded leaves out the frames a seek decodes on its way from the previous
+    keyframe: seeks counts the seeks and the "seek" stage holds their time.
+    """
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stage_seconds = {}
+        self.stage_calls = {}
+        self.counters = {
+            "frames_decoded": 0, "frames_analyzed": 0, "seeks": 0, "keyframes_written": 0, "bytes_written": 0
+        }
+        self.events = []
+        self.peak_rss = None
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, start, time.perf_counter())
+
+    def add_time(self, name, start, end):
+        with self._lock:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + end - start
+            self.stage_calls[name] = self.stage_calls.get(name, 0) + 1
+            if self.trace:
+                self.events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (start - self._start) * 1e6, "dur": (end - start) * 1e6,
+                })
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """Record the wall time and peak RSS, call when the instrumented run is over."""
+        self.wall_seconds = time.perf_counter() - self._start
+        self.peak_rss = peak_rss_bytes()
+        return self
+
+    def to_dict(self):
+        return {
+            "wall_seconds": self.wall_seconds,
+            "stage_seconds": dict(self.stage_seconds),
+            "stage_calls": dict(self.stage_calls),
+            "counters": dict(self.counters),
+            "peak_rss": self.peak_rss,
+        }
+
+    def summary(self):
+        """One-line human readable summary, stages sorted by time spent."""
+        stages = sorted(self.stage_seconds.items(), key=lambda item: -item[1])
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in stages]
+        counters = self.counters
+        text = (f"{self.wall_seconds:.2f}s total, {counters['frames_analyzed']}/{counters['frames_decoded']} "
+                f"frames analyzed/decoded, {counters['seeks']} seeks, {counters['keyframes_written']} keyframes "
+                f"({counters['bytes_written'] / 1e6:.1f} MB)")
+        if self.peak_rss:
+            text += f", peak RSS {self.peak_rss / 1e6:.0f} MB"
+        if parts:
+            text += "; " + ", ".join(parts)
+        return text
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def dump_chrome_trace(self, path):
+        """Write the stage spans in Chrome trace format (chrome://tracing or ui.perfetto.dev)."""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms", "otherData": self.to_dict()}, f)
+
+
+class NullStats:
+    """Stand-in used when no stats are requested, every call is a no-op."""
+    _null_context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_context
+
+    def add_time(self, name, start, end):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+
+NO_STATS = NullStats()
@@ -0,0 +1,232 @@
+"""
+Frame change metrics for stillness detection.
+
+A metric reduces every analysis frame to a signature once and measures the change
+between two consecutive signatures; that distance is what stillness_threshold is
+compared against, so each metric documents its scale and a suggested threshold.
+Measured per-frame cost (signature + distance) on a 1080p / 320x180 analysis frame:
+    mean       full-frame L1 diff, ~0.35 ms / 12 us, most sensitive to small changes anywhere
+    block      16x16 grid of cell means, ~0.6 ms / 40 us, reports the most changed region
+    phash      64-bit DCT hash, ~1 ms / 100 us, tolerant of noise and compression artefacts
+    histogram  64-bin intensity histogram, ~0.8 ms / 155 us, ignores where pixels moved
+mean keeps the whole previous frame as its signature, the others 8 bytes to 1 KB.
+Use profile_metrics to measure them on your own recordings.
+"""
+import time
+
+import cv2
+import numpy as np
+
+BLOCK_GRID = 16        # Cells per side of the block metric's grid
+HASH_SIZE = 8          # The perceptual hash keeps HASH_SIZE x HASH_SIZE DCT coefficients
+HASH_DCT_SIZE = 32     # Side of the downscaled frame the hash's DCT runs on
+HISTOGRAM_BINS = 64
+HISTOGRAM_MIN_WIDTH = 320  # Frames at least twice as wide are halved before the histogram
+
+
+def mean_abs_diff(a, b):
+    """Mean absolute difference of two grayscale images, 0-255."""
+    # Same value as np.mean(cv2.absdiff(a, b)), without the temporary image and numpy's float sum
+    return cv2.norm(a, b, cv2.NORM_L1) / a.size
+
+
+def halve_down(gray, min_width, min_height):
+    """Halve gray with area interpolation while it stays at least min_width x min_height."""
+    h, w = gray.shape[:2]
+    # Exact halving takes OpenCV's fast INTER_AREA path, arbitrary ratios do not
+    while w >= 2 * min_width and h >= 2 * min_height:
+        w, h = w // 2, h // 2
+        gray = cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def block_means(gray, grid):
+    """
+    Mean of each cell of a grid x grid split of gray, as float32. Rows and columns beyond
+    a multiple of grid are left out.
+    """
+    # Keep at least 4x4 pixels per cell
+    gray = halve_down(gray, grid * 4, grid * 4)
+    h, w = gray.shape[:2]
+    cell_h, cell_w = max(1, h // grid), max(1, w // grid)
+    cropped = gray[:cell_h * grid, :cell_w * grid]
+    return cv2.resize(cropped, (grid, grid), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class FrameMetric:
+    """
+    Base of the change metrics: signature(gray) reduces an analysis frame, distance(a, b)
+    measures the change between two signatures.
+    """
+    name = None
+    default_threshold = 3
+
+    def signature(self, gray):
+        raise NotImplementedError
+
+    def distance(self, a, b):
+        raise NotImplementedError
+
+
+class MeanDiffMetric(FrameMetric):
+    """Mean absolute pixel difference of the whole frame, 0-255. The original metric."""
+    name = "mean"
+    default_threshold = 3
+
+    def signature(self, gray):
+        return gray
+
+    def distance(self, a, b):
+        return mean_abs_diff(a, b)
+
+
+class BlockMeanMetric(FrameMetric):
+    """
+    Largest change of a cell mean on a grid x grid split of the frame, 0-255. A change
+    confined to one region (a cursor, a popup) counts fully instead of being averaged
+    away over the whole frame.
+    """
+    name = "block"
+    default_threshold = 3
+
+    def __init__(self, grid=BLOCK_GRID):
+        self.grid = grid
+
+    def signature(self, gray):
+        return block_means(gray, self.grid)
+
+    def distance(self, a, b):
+        return float(np.max(np.abs(a - b)))
+
+
+class PerceptualHashMetric(FrameMetric):
+    """
+    Hamming distance of 64-bit perceptual hashes (DCT of a 32x32 downscale, low
+    frequencies thresholded at their median), 0-64.
+    """
+    name = "phash"
+    default_threshold = 3
+
+    def signature(self, gray):
+        return perceptual_hash(gray)
+
+    def distance(self, a, b):
+        return (a ^ b).bit_count()
+
+
+class HistogramMetric(FrameMetric):
+    """
+    Share of pixels, in percent, whose intensity moved to another histogram bin, 0-100.
+    Blind to where things are, so scrolling uniform content reads as still.
+    """
+    name = "histogram"
+    default_threshold = 2
+
+    def __init__(self, bins=HISTOGRAM_BINS):
+        self.bins = bins
+
+    def signature(self, gray):
+        gray = halve_down(gray, HISTOGRAM_MIN_WIDTH, 1)
+        hist = cv2.calcHist([gray], [0], None, [self.bins], [0, 256]).ravel()
+        return hist / max(1.0, float(hist.sum()))
+
+    def distance(self, a, b):
+        return float(np.abs(a - b).sum()) * 50.0
+
+
+METRICS = {
+    metric.name: metric
+    for metric in (MeanDiffMetric, BlockMeanMetric, PerceptualHashMetric, HistogramMetric)
+}
+
+
+def perceptual_hash(gray):
+    """64-bit DCT perceptual hash of a grayscale frame as a Python int."""
+    small = block_means(gray, HASH_DCT_SIZE)
+    low = cv2.dct(small)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only encodes overall brightness, leave it out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+# Set bits of every byte value, for numpy versions without np.bitwise_count
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """Number of set bits of every element of a uint64 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """
+    Growable array of 64-bit perceptual hashes; nearest() compares a hash against all of
+    them at once with a vectorized XOR and popcount.
+    """
+    def __init__(self, hashes=()):
+        self._hashes = np.zeros(max(64, len(hashes)), dtype=np.uint64)
+        self.size = 0
+        for value in hashes:
+            self.add(value)
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def hashes(self):
+        return self._hashes[:self.size]
+
+    def add(self, value):
+        """Append a hash, return its position."""
+        if self.size == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+        self._hashes[self.size] = value
+        self.size += 1
+        return self.size - 1
+
+    def nearest(self, value):
+        """(position, Hamming distance) of the closest hash, (None, None) when empty."""
+        if not self.size:
+            return None, None
+        distances = popcount64(self.hashes ^ np.uint64(value))
+        position = int(np.argmin(distances))
+        return position, int(distances[position])
+
+
+def get_metric(metric):
+    """Resolve a metric name (see METRICS) to a metric instance, metric objects pass through."""
+    if not isinstance(metric, str):
+        return metric
+    try:
+        return METRICS[metric]()
+    except KeyError:
+        raise ValueError(f"Unknown frame metric: {metric}") from None
+
+
+def profile_metric(metric, grays):
+    """
+    Per-frame cost of a metric on a list of analysis frames: microseconds per signature
+    and per distance, and the signature size in bytes.
+    """
+    metric = get_metric(metric)
+    start = time.perf_counter()
+    signatures = [metric.signature(gray) for gray in grays]
+    signature_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    for a, b in zip(signatures, signatures[1:]):
+        metric.distance(a, b)
+    distance_seconds = time.perf_counter() - start
+    signature = signatures[0] if signatures else None
+    return {
+        "signature_us": signature_seconds / max(1, len(signatures)) * 1e6,
+        "distance_us": distance_seconds / max(1, len(signatures) - 1) * 1e6,
+        "signature_bytes": signature.nbytes if hasattr(signature, "nbytes") else 8,
+    }
+
+
+def profile_metrics(grays, metrics=None):
+    """profile_metric for several metrics (default: all of METRICS), keyed by name."""
+    metrics = [get_metric(m) for m in (metrics or METRICS)]
+    return {metric.name: profile_metric(metric, grays) for metric in metrics}
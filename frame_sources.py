@@ -0,0 +1,260 @@
+import shutil
+import subprocess
+import tempfile
+
+import cv2
+import numpy as np
+
+from extraction_stats import NO_STATS
+
+SAMPLING_MODES = ("read", "grab", "seek")
+SEEK_MIN_INTERVAL = 30     # Sampled frames at least this far apart are reached by seeking
+FFMPEG_BUFFERS = 16        # Minimum preallocated frame buffers an FFmpegPipeSource cycles through
+
+
+def sample_interval(fps, sample_rate):
+    """
+    Frames between two sampled frames when sampling sample_rate frames per second of an
+    fps video. At least 1: videos with fewer fps than sample_rate (or an unknown fps of 0)
+    have every frame sampled.
+    """
+    return max(1, int(fps // sample_rate))
+
+
+def iter_sampled_frames(
+    cap, frame_interval, sampling="auto", progress_callback=None, total_frames=0,
+    start_frame=0, end_frame=None, stats=None, cancel_token=None
+):
+    """
+    Yield (frame_idx, timestamp, frame) for every frame_interval-th frame of cap,
+    from start_frame up to (excluding) end_frame, or to the end of the video. cap
+    only seeks to start_frame when it isn't there already.
+    Only the yielded frames are retrieved (decoded and converted to BGR).
+    sampling: "read" reads every frame (legacy behaviour),
+              "grab" advances over skipped frames with cap.grab() without retrieving them,
+              "seek" jumps straight to the next sampled frame,
+              "auto" uses "seek" for sparse sampling and "grab" otherwise.
+    progress_callback: function(current_frame, total_frames)
+    stats: ExtractionStats recording the "decode", "seek" and "progress" stages. A seek
+    decodes from the previous keyframe, those frames are not in frames_decoded: seeks are
+    counted separately and their cost is the "seek" stage time
+    cancel_token: object whose check() is called before every frame; it may block to
+    pause the extraction or raise to cancel it (see extraction_jobs.CancelToken)
+    """
+    stats = stats or NO_STATS
+    if sampling == "auto":
+        sampling = "seek" if frame_interval >= SEEK_MIN_INTERVAL else "grab"
+    if sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    frame_idx = start_frame
+    if start_frame > 0 and cap.get(cv2.CAP_PROP_POS_FRAMES) != start_frame:
+        with stats.stage("seek"):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        stats.count("seeks")
+    while end_frame is None or frame_idx < end_frame:
+        if cancel_token:
+            cancel_token.check()
+        seeking = sampling == "seek" and frame_idx % frame_interval != 0
+        with stats.stage("seek" if seeking else "decode"):
+            if frame_idx % frame_interval == 0:
+                ret, frame = cap.read()
+                timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            elif seeking:
+                frame_idx += frame_interval - frame_idx % frame_interval
+                if total_frames > 0 and frame_idx >= total_frames:
+                    break
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                stats.count("seeks")
+                ret, frame = True, None
+            elif sampling == "grab":
+                ret, frame = cap.grab(), None
+            else:
+                ret, _ = cap.read()
+                frame = None
+        if not ret:
+            break
+        if frame is not None:
+            stats.count("frames_decoded")
+            yield frame_idx, timestamp, frame
+            frame_idx += 1
+        elif not seeking:
+            stats.count("frames_decoded")
+            frame_idx += 1
+        if progress_callback:
+            with stats.stage("progress"):
+                progress_callback(frame_idx, total_frames)
+
+
+def analysis_dimensions(width, height, analysis_size=None):
+    """Size of the analysis frame to_analysis_gray makes of a width x height frame."""
+    if not analysis_size or width <= analysis_size:
+        return width, height
+    return analysis_size, max(1, round(height * analysis_size / width))
+
+
+class VideoCaptureSource:
+    """
+    Frames decoded by cv2.VideoCapture, full-size BGR; the default source.
+    backend: cv2.CAP_* API preference, e.g. cv2.CAP_FFMPEG or cv2.CAP_MSMF, CAP_ANY lets
+    OpenCV pick
+    threads: decoder threads (CAP_PROP_N_THREADS), None keeps the backend's default
+    hw_acceleration: ask the backend for any available hardware decoder
+    """
+    name = "opencv"
+    analysis_frames = False  # Yields full frames, the caller converts them for analysis
+
+    def __init__(self, backend=cv2.CAP_ANY, threads=None, hw_acceleration=False):
+        self.backend = backend
+        self.threads = threads
+        self.hw_acceleration = hw_acceleration
+
+    def open(self, video_path):
+        params = []
+        if self.threads is not None and hasattr(cv2, "CAP_PROP_N_THREADS"):
+            params += [cv2.CAP_PROP_N_THREADS, self.threads]
+        if self.hw_acceleration:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        return cv2.VideoCapture(video_path, self.backend, params)
+
+    def probe(self, video_path):
+        """Return (fps, total_frames, width, height) of a video."""
+        cap = self.open(video_path)
+        try:
+            return (
+                cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            )
+        finally:
+            cap.release()
+
+    def sampled_frames(
+        self, video_path, frame_interval, sampling="auto", progress_callback=None, total_frames=0,
+        analysis_size=None, stats=None, cancel_token=None, held_frames=0
+    ):
+        """
+        iter_sampled_frames over a capture opened by this source, released when done.
+        Every frame is a new array, so held_frames is ignored.
+        """
+        cap = self.open(video_path)
+        try:
+            yield from iter_sampled_frames(
+                cap, frame_interval, sampling, progress_callback, total_frames, stats=stats,
+                cancel_token=cancel_token
+            )
+        finally:
+            cap.release()
+
+
+class FFmpegPipeSource:
+    """
+    Frames decoded by an ffmpeg subprocess. Frame selection, scaling to analysis_size and
+    the gray conversion all run inside ffmpeg, only analysis-sized gray frames cross the
+    pipe, and they are read with readinto() straight into a ring of preallocated arrays.
+    Yields analysis frames (analysis_frames = True), so extract_keyframes reads the full
+    resolution keyframes afterwards by seeking. Timestamps are frame_idx / fps.
+    The ring has at least buffers arrays, and more when sampled_frames is told that the
+    consumer holds on to more frames (held_frames), so a frame is never overwritten while
+    it is still referenced.
+    ffmpeg: path or name of the ffmpeg executable
+    threads: decoder threads (-threads), None lets ffmpeg decide
+    hw_acceleration: decode with -hwaccel auto
+    """
+    name = "ffmpeg"
+    analysis_frames = True
+
+    def __init__(self, ffmpeg="ffmpeg", threads=None, hw_acceleration=False, buffers=FFMPEG_BUFFERS):
+        self.ffmpeg = ffmpeg
+        self.threads = threads
+        self.hw_acceleration = hw_acceleration
+        self.buffers = buffers
+
+    def available(self):
+        return shutil.which(self.ffmpeg) is not None
+
+    def probe(self, video_path):
+        # The container metadata is read with OpenCV, which is there anyway
+        return VideoCaptureSource().probe(video_path)
+
+    def command(self, video_path, frame_interval, width, height, scale=True):
+        cmd = [self.ffmpeg, "-v", "error", "-nostdin"]
+        if self.hw_acceleration:
+            cmd += ["-hwaccel", "auto"]
+        if self.threads is not None:
+            cmd += ["-threads", str(self.threads)]
+        # Keep every frame_interval-th decoded frame, the same frames iter_sampled_frames samples
+        filters = [f"select=not(mod(n\\,{frame_interval}))"]
+        if scale:
+            filters.append(f"scale={width}:{height}:flags=area")
+        filters.append("format=gray")
+        cmd += [
+            "-i", video_path, "-an", "-sn", "-vf", ",".join(filters), "-vsync", "passthrough",
+            "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"
+        ]
+        return cmd
+
+    def sampled_frames(
+        self, video_path, frame_interval, sampling="auto", progress_callback=None, total_frames=0,
+        analysis_size=None, stats=None, cancel_token=None, held_frames=0
+    ):
+        """
+        Yield (frame_idx, timestamp, gray) for every frame_interval-th frame, gray being
+        the analysis frame. sampling is ignored, ffmpeg decodes every frame anyway.
+        held_frames: earlier frames the consumer may still reference when it asks for the
+        next one, e.g. a decode queue plus the previous frame kept as a metric signature.
+        The gray frames are reused after that many more frames.
+        """
+        stats = stats or NO_STATS
+        fps, _, src_width, src_height = self.probe(video_path)
+        if src_width <= 0 or src_height <= 0:
+            raise RuntimeError(f"Could not read the frame size of {video_path}")
+        width, height = analysis_dimensions(src_width, src_height, analysis_size)
+        ring = [np.empty((height, width), dtype=np.uint8) for _ in range(max(self.buffers, held_frames + 1))]
+        cmd = self.command(video_path, frame_interval, width, height, (width, height) != (src_width, src_height))
+        # A file, not a pipe, so a chatty ffmpeg can't block on a full stderr pipe
+        errors = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors, bufsize=0)
+        except FileNotFoundError:
+            errors.close()
+            raise RuntimeError(f"ffmpeg executable not found: {self.ffmpeg}") from None
+        try:
+            count = 0
+            while True:
+                if cancel_token:
+                    cancel_token.check()
+                frame = ring[count % len(ring)]
+                with stats.stage("decode"):
+                    filled = read_exactly(process.stdout, memoryview(frame).cast("B"))
+                if filled < frame.nbytes:
+                    break
+                stats.count("frames_decoded")
+                frame_idx = count * frame_interval
+                yield frame_idx, frame_idx / fps if fps else 0.0, frame
+                count += 1
+                if progress_callback:
+                    with stats.stage("progress"):
+                        progress_callback(min(frame_idx + frame_interval, total_frames), total_frames)
+            if process.wait() != 0:
+                errors.seek(0)
+                error = errors.read().decode("utf-8", "replace").strip()
+                raise RuntimeError(f"ffmpeg failed on {video_path}: {error}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            errors.close()
+
+
+FRAME_SOURCES = {source.name: source for source in (VideoCaptureSource, FFmpegPipeSource)}
+
+
+def read_exactly(stream, view):
+    """readinto() until view is full or the stream ends, return the number of bytes read."""
+    filled = 0
+    while filled < len(view):
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
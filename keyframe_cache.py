@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from extract_keyframes import (
+    DIFF_SERIES_DTYPE, scan_frame_diffs, select_keyframes, save_keyframes_at
+)
+from extraction_stats import NO_STATS
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".keyframe_extractor_cache")
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024  # Bytes of diff series kept before evicting
+FINGERPRINT_CHUNK = 1024 * 1024  # Bytes hashed from the start and the end of a video
+
+
+def video_fingerprint(video_path):
+    """
+    Cheap identity of a video file: its size, mtime and a hash of its first and last
+    megabyte, so multi-gigabyte recordings don't have to be read completely.
+    """
+    stat = os.stat(video_path)
+    digest = hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    with open(video_path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if stat.st_size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, stat.st_size - FINGERPRINT_CHUNK))
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def diff_cache_key(video_path, sample_rate, analysis_size=None, metric="mean", source="opencv"):
+    """
+    Cache key of a diff series, everything that changes the diffs is part of it. Sources
+    scale the analysis frames differently, so the source name is too.
+    """
+    key = json.dumps([video_fingerprint(video_path), sample_rate, analysis_size, metric, source])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class DiffCache:
+    """
+    Size-bounded LRU store of diff series, one .npy file per key in cache_dir.
+    A file's mtime is its last use; the least recently used files are evicted once
+    the cache grows beyond max_bytes.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            series = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+        if series.dtype != DIFF_SERIES_DTYPE:
+            return None
+        os.utime(path)
+        return series
+
+    def put(self, key, series):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, series.astype(DIFF_SERIES_DTYPE, copy=False), allow_pickle=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+def extract_keyframes_cached(
+    video_path, output_dir, diff_threshold=25, sample_rate=24, min_interval=0.5,
+    stillness_threshold=3, stillness_frames=5, progress_callback=None, sampling="auto",
+    analysis_size=None, cache=None, stats=None, cancel_token=None, metric="mean",
+    dedupe_distance=None, dedupe_mode="skip", image_format=None, in_memory=None, source=None
+):
+    """
+    Same result as extract_keyframes, but the video's diff series is kept in a DiffCache.
+    When it is cached, changing stillness_threshold, stillness_frames or min_interval only
+    replays the series and decodes the selected keyframes.
+    cache: DiffCache to use, defaults to one in DEFAULT_CACHE_DIR
+    stats: ExtractionStats to record per-stage timings and counters in, None to skip
+    cancel_token: cooperative pause/cancel flag, see iter_sampled_frames
+    metric: frame change metric name, see frame_metrics
+    dedupe_distance, dedupe_mode: near-duplicate suppression, see extract_keyframes
+    image_format, in_memory: how the keyframes are kept, see extract_keyframes
+    source: frame source the diffs are scanned with, see frame_sources
+    """
+    stats = stats or NO_STATS
+    cache = cache or DiffCache()
+    with stats.stage("cache"):
+        key = diff_cache_key(video_path, sample_rate, analysis_size, metric, source.name if source else "opencv")
+        series = cache.get(key)
+    if series is None:
+        series = scan_frame_diffs(
+            video_path, sample_rate, analysis_size, progress_callback, sampling, stats=stats,
+            cancel_token=cancel_token, metric=metric, source=source
+        )
+        with stats.stage("cache"):
+            cache.put(key, series)
+    with stats.stage("select"):
+        selected = select_keyframes(series, stillness_threshold, stillness_frames, min_interval)
+    return save_keyframes_at(
+        video_path, output_dir, series["frame_idx"][selected].tolist(), series["timestamp"][selected].tolist(),
+        stats=stats, cancel_token=cancel_token, dedupe_distance=dedupe_distance, dedupe_mode=dedupe_mode,
+        image_format=image_format, in_memory=in_memory
+    )
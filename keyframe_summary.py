@@ -0,0 +1,163 @@
+"""
+Scene summaries: contact sheets of the keyframes at several sizes plus an index of the tiles.
+
+Every keyframe is decoded once, at the size of the largest sheet (JPEG keyframes are
+decoded at reduced resolution by the JPEG decoder when no sheet needs the full size),
+and each smaller tile is downscaled from the previous one. The sheets are streamed to
+PNG a row of tiles at a time, like merge_keyframes_streaming. summary.json and summary.csv
+map every tile's grid position to its timestamp and keyframe file, so a viewer can
+show the thumbnail sheet and lazy-load single keyframes instead of the full sheet.
+"""
+import csv
+import glob
+import json
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from extract_keyframes import PNGStreamWriter, draw_timestamp_label, load_keyframe_image, load_label_font
+from extraction_stats import NO_STATS
+
+# (name, tile width in pixels), None keeps the keyframes' own size
+SUMMARY_SIZES = (("thumb", 160), ("medium", 480), ("full", None))
+SUMMARY_INDEX_NAME = "summary.json"
+SUMMARY_CSV_NAME = "summary.csv"
+LABEL_SIZE = 80      # Label font size on full-size tiles, scaled with the tile width
+LABEL_PADDING = 20
+
+
+def tile_sizes(src_size, sizes=SUMMARY_SIZES):
+    """Tile (width, height) of every sheet of sizes, never larger than src_size."""
+    src_w, src_h = src_size
+    tiles = {}
+    for name, width in sizes:
+        w = min(width, src_w) if width else src_w
+        tiles[name] = (w, max(1, round(src_h * w / src_w)))
+    return tiles
+
+
+def load_tile_source(source, size):
+    """
+    Open a keyframe for tiles of at most size: JPEG files and bytes are decoded straight
+    at a reduced scale when that is still larger than size.
+    """
+    img = load_keyframe_image(source)
+    if img is not source:
+        img.draft("RGB", size)
+    img.load()
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    return img
+
+
+def write_summary(
+    keyframes, output_dir, max_per_row=5, sizes=SUMMARY_SIZES, compression=6, full_sheet=None, stats=None
+):
+    """
+    Write a PNG contact sheet per entry of sizes (summary_<name>.png) and the tile index
+    (summary.json, summary.csv) to output_dir. Returns the index.
+    Like merge_keyframes_streaming, every sheet is written a row of tiles at a time, so
+    only one keyframe and one row strip per sheet are held in memory.
+    keyframes: list of (image, timestamp) as accepted by merge_keyframes
+    compression: zlib level of the sheets, lower is faster
+    full_sheet: file name in output_dir of an existing full-size grid of the same keyframes
+    and max_per_row (merge_keyframes_streaming with scale=1.0 writes one); the index refers
+    to it instead of writing the full-size sheet again
+    stats: ExtractionStats recording the "summary_load", "summary_compose" and "summary_save" stages
+    """
+    stats = stats or NO_STATS
+    if not keyframes:
+        print("No keyframes to summarize.")
+        return None
+    os.makedirs(output_dir, exist_ok=True)
+    first = load_keyframe_image(keyframes[0][0])
+    src_w = first.size[0]
+    tiles = tile_sizes(first.size, sizes)
+    if first is not keyframes[0][0]:
+        first.close()
+    n = len(keyframes)
+    cols = min(n, max_per_row)
+    rows = (n + max_per_row - 1) // max_per_row
+
+    index = {"columns": cols, "rows": rows, "sheets": [], "tiles": []}
+    paths = {}
+    fonts = {}
+    for name, width in sizes:
+        w, h = tiles[name]
+        if width is None and full_sheet:
+            path = os.path.join(output_dir, full_sheet)
+        else:
+            path = os.path.join(output_dir, f"summary_{name}.png")
+            paths[name] = path
+            scale = w / src_w
+            fonts[name] = (load_label_font(max(8, round(LABEL_SIZE * scale))), max(2, round(LABEL_PADDING * scale)))
+        index["sheets"].append({
+            "name": name,
+            "path": os.path.basename(path),
+            "tile_width": w,
+            "tile_height": h,
+            "width": cols * w,
+            "height": rows * h,
+        })
+    # Largest first, each tile is downscaled from the one before
+    order = sorted(paths, key=lambda name: tiles[name][0], reverse=True)
+
+    writers = {}
+    try:
+        for name in order:
+            w, h = tiles[name]
+            writers[name] = PNGStreamWriter(paths[name], cols * w, rows * h, compression)
+        for row in range(rows):
+            strips = {name: Image.new("RGB", (cols * tiles[name][0], tiles[name][1]), (0, 0, 0)) for name in order}
+            draws = {name: ImageDraw.Draw(strip) for name, strip in strips.items()}
+            for col, (source, timestamp) in enumerate(keyframes[row * max_per_row:(row + 1) * max_per_row]):
+                with stats.stage("summary_load"):
+                    img = load_tile_source(source, tiles[order[0]]) if order else None
+                tile = img
+                with stats.stage("summary_compose"):
+                    for name in order:
+                        w, h = tiles[name]
+                        if tile.size != (w, h):
+                            tile = tile.resize((w, h), Image.BOX)
+                        strips[name].paste(tile, (col * w, 0))
+                        font, padding = fonts[name]
+                        draw_timestamp_label(draws[name], col * w, 0, w, h, timestamp, font, padding)
+                if img is not None and img is not source:
+                    img.close()
+                index["tiles"].append({
+                    "index": row * max_per_row + col,
+                    "row": row,
+                    "column": col,
+                    "timestamp": timestamp,
+                    "keyframe": os.path.basename(source) if isinstance(source, str) else None,
+                })
+            with stats.stage("summary_save"):
+                for name in order:
+                    writers[name].write_rows(np.asarray(strips[name]))
+                    strips[name].close()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    for name in order:
+        stats.count("bytes_written", os.path.getsize(paths[name]))
+    write_index(output_dir, index)
+    print(f"Summary sheets saved to {output_dir}")
+    return index
+
+
+def summary_files(output_dir):
+    """Paths of the sheets and index files an earlier write_summary left in output_dir."""
+    paths = glob.glob(os.path.join(output_dir, "summary_*.png"))
+    paths += [os.path.join(output_dir, name) for name in (SUMMARY_INDEX_NAME, SUMMARY_CSV_NAME)]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def write_index(output_dir, index):
+    """Write the tile index as summary.json and, one row per tile, summary.csv."""
+    with open(os.path.join(output_dir, SUMMARY_INDEX_NAME), "w") as f:
+        json.dump(index, f, indent=2)
+    with open(os.path.join(output_dir, SUMMARY_CSV_NAME), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["index", "row", "column", "timestamp", "keyframe"])
+        writer.writeheader()
+        writer.writerows(index["tiles"])
@@ -0,0 +1,88 @@
+"""
+Tests of adaptive sampling (extract_keyframes_adaptive) against a full scan, and of the
+sampling of videos with fewer frames per second than the sample rate, on small generated
+videos.
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extract_keyframes import (  # noqa: E402
+    extract_keyframes, extract_keyframes_adaptive, sample_interval, scan_frame_diffs,
+    scan_frame_diffs_adaptive, select_keyframes
+)
+
+WIDTH, HEIGHT = 160, 96
+
+
+def write_video(path, fps, seconds, moving_every=3):
+    """
+    A slide deck: a new random scene every moving_every seconds, which scrolls during its
+    first second and then stays still.
+    """
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (WIDTH, HEIGHT))
+    if not writer.isOpened():
+        pytest.skip("OpenCV can't write mp4v videos here")
+    rng = np.random.default_rng(0)
+    scene = None
+    for i in range(int(fps * seconds)):
+        t = i / fps
+        if i % int(fps * moving_every) == 0:
+            scene = rng.integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8)
+        writer.write(np.roll(scene, i * 4, axis=1) if t % moving_every < 1 else scene)
+    writer.release()
+    return str(path)
+
+
+def keyframe_times(keyframes):
+    return [round(timestamp, 3) for _, timestamp in keyframes]
+
+
+def test_sample_interval_below_sample_rate():
+    assert sample_interval(10, 24) == 1
+    assert sample_interval(23.976, 24) == 1
+    assert sample_interval(0, 24) == 1
+    assert sample_interval(60, 24) == 2
+
+
+def test_low_fps_video_samples_every_frame(tmp_path):
+    # An interval of int(fps // sample_rate) = 0 used to fail with a modulo by zero
+    video = write_video(tmp_path / "low.mp4", fps=8, seconds=6)
+    series = scan_frame_diffs(video, sample_rate=24)
+    assert series["frame_idx"].tolist() == list(range(48))
+    full = extract_keyframes(video, None, sample_rate=24, in_memory="arrays")
+    adaptive = extract_keyframes_adaptive(video, None, sample_rate=24, in_memory="arrays")
+    assert keyframe_times(full)
+    assert keyframe_times(adaptive) == keyframe_times(full)
+
+
+@pytest.mark.parametrize("sampling", ["auto", "seek", "grab", "read"])
+def test_adaptive_matches_full_scan(tmp_path, sampling):
+    video = write_video(tmp_path / "slides.mp4", fps=30, seconds=12)
+    full = scan_frame_diffs(video)
+    expected = full["frame_idx"][select_keyframes(full)].tolist()
+    assert len(expected) == 4
+
+    series = scan_frame_diffs_adaptive(video, sampling=sampling)
+    assert series["frame_idx"].tolist() == full["frame_idx"].tolist()
+    assert series["frame_idx"][select_keyframes(series)].tolist() == expected
+    keyframes = extract_keyframes_adaptive(video, None, sampling=sampling, in_memory="arrays")
+    assert keyframe_times(keyframes) == keyframe_times(extract_keyframes(video, None, in_memory="arrays"))
+
+
+def test_adaptive_frame_callback_gets_the_series(tmp_path):
+    video = write_video(tmp_path / "slides.mp4", fps=30, seconds=6)
+    calls = []
+    series = scan_frame_diffs_adaptive(
+        video, sampling="grab", frame_callback=lambda *args: calls.append((args[:3], args[3] is not None))
+    )
+    assert [args for args, _ in calls] == series.tolist()
+    # Frames inside skipped intervals are not decoded, every analyzed frame is passed on
+    decoded = sum(has_frame for _, has_frame in calls)
+    assert 0 < decoded < len(calls)
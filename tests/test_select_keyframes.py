@@ -0,0 +1,84 @@
+"""
+Property tests of select_keyframes against the per-frame StillnessDetector loop of
+extract_keyframes, on random diff series.
+
+Run from the repository root: python -m pytest -q tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extract_keyframes import DIFF_SERIES_DTYPE, StillnessDetector, select_keyframes  # noqa: E402
+
+SERIES_PER_CASE = 40
+
+
+def replay(series, stillness_threshold, stillness_frames, min_interval):
+    """Keyframe positions of the extract_keyframes loop, fed the diffs directly."""
+    detector = StillnessDetector(stillness_threshold, stillness_frames)
+    last_keyframe_time = -min_interval
+    selected = []
+    for i, (_, timestamp, diff) in enumerate(series.tolist()):
+        entering = detector.push(diff)
+        if entering and (timestamp - last_keyframe_time) >= min_interval:
+            selected.append(i)
+            last_keyframe_time = timestamp
+    return selected
+
+
+def random_series(rng, stillness_threshold):
+    """
+    Runs of still and moving diffs, with a share of diffs exactly at the threshold (which
+    count as moving) and of zero diffs, at an irregular frame rate.
+    """
+    n = int(rng.integers(0, 400))
+    diffs = []
+    while len(diffs) < n:
+        run = int(rng.integers(1, 30))
+        kind = rng.random()
+        if kind < 0.4:
+            values = rng.uniform(0, stillness_threshold, run)
+        elif kind < 0.6:
+            values = np.full(run, float(stillness_threshold))
+        elif kind < 0.7:
+            values = np.zeros(run)
+        else:
+            values = rng.uniform(0, 4 * stillness_threshold, run)
+        diffs.extend(values.tolist())
+    diffs = diffs[:n]
+    # Steps on a 1/30 s grid, some repeated, so timestamps land exactly on min_interval
+    steps = rng.integers(0, 4, n) / 30.0
+    series = np.zeros(n, dtype=DIFF_SERIES_DTYPE)
+    series["frame_idx"] = np.arange(n)
+    series["timestamp"] = np.cumsum(steps)
+    series["diff"] = diffs
+    if n:
+        series["diff"][0] = 0
+    return series
+
+
+@pytest.mark.parametrize("stillness_frames", range(1, 21))
+@pytest.mark.parametrize("min_interval", [0, 1 / 30.0, 0.5, 2.0])
+def test_matches_stillness_detector(stillness_frames, min_interval):
+    rng = np.random.default_rng(stillness_frames * 1000 + int(min_interval * 300))
+    for _ in range(SERIES_PER_CASE):
+        stillness_threshold = float(rng.choice([0.5, 3, 3.25, 10]))
+        series = random_series(rng, stillness_threshold)
+        expected = replay(series, stillness_threshold, stillness_frames, min_interval)
+        assert select_keyframes(series, stillness_threshold, stillness_frames, min_interval) == expected
+
+
+def test_diff_at_threshold_is_moving():
+    series = np.zeros(12, dtype=DIFF_SERIES_DTYPE)
+    series["timestamp"] = np.arange(12)
+    series["diff"] = [0, 3, 3, 3, 1, 1, 1, 3, 1, 1, 1, 1]
+    assert select_keyframes(series, 3, 3, 0) == replay(series, 3, 3, 0) == [6, 10]
+
+
+def test_short_series():
+    series = np.zeros(3, dtype=DIFF_SERIES_DTYPE)
+    assert select_keyframes(series, 3, 5, 0.5) == replay(series, 3, 5, 0.5) == []
+    assert select_keyframes(series[:0], 3, 1, 0) == []